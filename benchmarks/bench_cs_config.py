@@ -0,0 +1,40 @@
+"""
+Benchmarks for the Compute Studio model, if cs-config is installed
+"""
+try:
+    from cs_config import functions
+except ImportError:
+    functions = None
+from .common import warm_defaults
+
+ADJUSTMENT = {
+    "policy": {
+        "II_em": [{"year": 2021, "value": 2000}],
+    },
+    "behavior": {},
+}
+BEHAVIOR_ADJUSTMENT = {
+    "policy": ADJUSTMENT["policy"],
+    "behavior": {"sub": [{"value": 0.25}]},
+}
+
+
+class RunModel:
+    # the sample used is set by cs-config: 3% of the CPS for a single year
+    # or the full CPS for ten years
+    params = ([False, True], [False, True])
+    param_names = ["use_full_sample", "behavior"]
+    timeout = 3600
+
+    def setup(self, use_full_sample, behavior):
+        if functions is None:
+            raise NotImplementedError("cs-config is not installed")
+        warm_defaults()
+        self.meta_params = {
+            "year": 2021, "data_source": "CPS",
+            "use_full_sample": use_full_sample
+        }
+        self.adjustment = BEHAVIOR_ADJUSTMENT if behavior else ADJUSTMENT
+
+    def time_run_model(self, use_full_sample, behavior):
+        functions.run_model(self.meta_params, self.adjustment)
@@ -0,0 +1,20 @@
+"""
+Benchmarks for importing taxbrain. Each import is timed in a new process
+"""
+
+
+def timeraw_import_taxbrain():
+    return "import taxbrain"
+
+
+def timeraw_import_taxbrain_and_plot():
+    # cost of the plotting dependencies once a plot is made
+    return """
+    import taxbrain
+    import matplotlib.pyplot
+    """
+
+
+def timeraw_import_taxcalc():
+    # most of the time to import taxbrain is spent importing Tax-Calculator
+    return "import taxcalc"
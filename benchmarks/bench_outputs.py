@@ -0,0 +1,50 @@
+"""
+Benchmarks for the report and the command line interface
+"""
+import shutil
+import tempfile
+import matplotlib
+import matplotlib.pyplot as plt
+from taxbrain import report, cli_core
+from .common import (SAMPLE_FRACS, NUM_YEARS, START_YEAR, REFORM,
+                     cps_sample, run_taxbrain, warm_defaults)
+
+matplotlib.use("Agg")
+
+
+class Report:
+    params = (SAMPLE_FRACS, [5])
+    param_names = ["sample_frac", "num_years"]
+    timeout = 1800
+
+    def setup(self, frac, num_years):
+        self.tb = run_taxbrain(frac, num_years)
+        self.outdir = tempfile.mkdtemp()
+
+    def teardown(self, frac, num_years):
+        plt.close("all")
+        shutil.rmtree(self.outdir, ignore_errors=True)
+
+    def time_report(self, frac, num_years):
+        # converting to PDF is left out, it only times pandoc and LaTeX
+        self.tb.clear_cache()
+        report(self.tb, name="Benchmark Report", outdir=self.outdir,
+               clean=True, pdf=False)
+
+
+class CLI:
+    params = (SAMPLE_FRACS, NUM_YEARS)
+    param_names = ["sample_frac", "num_years"]
+    timeout = 1800
+
+    def setup(self, frac, num_years):
+        warm_defaults()
+        self.data = cps_sample(frac)
+        self.outdir = tempfile.mkdtemp()
+
+    def teardown(self, frac, num_years):
+        shutil.rmtree(self.outdir, ignore_errors=True)
+
+    def time_cli_core(self, frac, num_years):
+        cli_core(START_YEAR, START_YEAR + num_years - 1, self.data, True,
+                 REFORM, {}, None, None, self.outdir, "benchmark", False, "")
@@ -0,0 +1,42 @@
+"""
+Benchmarks for the plotting functions
+"""
+import matplotlib
+import matplotlib.pyplot as plt
+from taxbrain import (distribution_plot, differences_plot, lorenz_curve,
+                      volcano_plot, revenue_plot)
+from .common import SAMPLE_FRACS, START_YEAR, run_taxbrain
+
+matplotlib.use("Agg")
+
+
+class Plots:
+    params = (SAMPLE_FRACS, [5])
+    param_names = ["sample_frac", "num_years"]
+    timeout = 1800
+
+    def setup(self, frac, num_years):
+        self.tb = run_taxbrain(frac, num_years)
+
+    def teardown(self, frac, num_years):
+        plt.close("all")
+
+    def time_distribution_plot(self, frac, num_years):
+        self.tb.clear_cache()
+        distribution_plot(self.tb, START_YEAR)
+
+    def time_differences_plot(self, frac, num_years):
+        self.tb.clear_cache()
+        differences_plot(self.tb, "combined")
+
+    def time_lorenz_curve(self, frac, num_years):
+        self.tb.clear_cache()
+        lorenz_curve(self.tb, START_YEAR)
+
+    def time_volcano_plot(self, frac, num_years):
+        self.tb.clear_cache()
+        volcano_plot(self.tb, START_YEAR)
+
+    def time_revenue_plot(self, frac, num_years):
+        self.tb.clear_cache()
+        revenue_plot(self.tb)
@@ -0,0 +1,26 @@
+"""
+Benchmarks for running the calculators
+"""
+from .common import SAMPLE_FRACS, NUM_YEARS, BEHAVIOR, make_taxbrain
+
+
+class Run:
+    params = (SAMPLE_FRACS, NUM_YEARS)
+    param_names = ["sample_frac", "num_years"]
+    timeout = 1800
+
+    def setup(self, frac, num_years):
+        self.tb = make_taxbrain(frac, num_years)
+        self.tb_dynamic = make_taxbrain(frac, num_years, BEHAVIOR)
+
+    def time_static_run(self, frac, num_years):
+        self.tb.run()
+
+    def time_dynamic_run(self, frac, num_years):
+        self.tb_dynamic.run()
+
+    def peakmem_static_run(self, frac, num_years):
+        self.tb.run()
+
+    def peakmem_dynamic_run(self, frac, num_years):
+        self.tb_dynamic.run()
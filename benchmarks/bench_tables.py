@@ -0,0 +1,43 @@
+"""
+Benchmarks for building tables from the results of a run
+"""
+from .common import SAMPLE_FRACS, START_YEAR, run_taxbrain
+
+GROUPBY = ["weighted_deciles", "standard_income_bins", "soi_agi_bins"]
+
+
+class Tables:
+    params = (SAMPLE_FRACS, GROUPBY)
+    param_names = ["sample_frac", "groupby"]
+    timeout = 1800
+
+    def setup(self, frac, groupby):
+        self.tb = run_taxbrain(frac, 1)
+
+    def time_distribution_table(self, frac, groupby):
+        # tables and income groups are cached, so start from scratch
+        self.tb.clear_cache()
+        self.tb.distribution_table(START_YEAR, groupby, "expanded_income",
+                                   "reform")
+
+    def time_differences_table(self, frac, groupby):
+        self.tb.clear_cache()
+        self.tb.differences_table(START_YEAR, groupby, "combined")
+
+
+class WeightedTotals:
+    params = (SAMPLE_FRACS, [5])
+    param_names = ["sample_frac", "num_years"]
+    timeout = 1800
+
+    def setup(self, frac, num_years):
+        self.tb = run_taxbrain(frac, num_years)
+
+    def time_weighted_totals(self, frac, num_years):
+        # weighted sums are cached until new results are stored
+        self.tb.clear_cache()
+        self.tb.weighted_totals("combined")
+
+    def time_multi_var_table(self, frac, num_years):
+        self.tb.clear_cache()
+        self.tb.multi_var_table(["iitax", "payrolltax", "combined"], "reform")
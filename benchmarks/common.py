@@ -0,0 +1,63 @@
+"""
+Inputs shared by the Tax-Brain benchmarks
+"""
+import os
+import taxcalc as tc
+import pandas as pd
+from taxbrain import TaxBrain
+from taxbrain.cache import DEFAULTS_CACHE
+
+
+START_YEAR = 2021
+# share of the CPS records used in each benchmark
+SAMPLE_FRACS = [0.05, 0.25, 1.0]
+# number of years in each run
+NUM_YEARS = [1, 5]
+REFORM = {
+    "II_em": {2021: 2000},
+    "STD": {2021: [15000, 30000, 15000, 22500, 30000]}
+}
+BEHAVIOR = {"sub": 0.25, "inc": -0.1}
+
+_CPS = None
+
+
+def cps_sample(frac):
+    """
+    Sample of the CPS records shipped with Tax-Calculator. The file is only
+    read once in each benchmark process
+    """
+    global _CPS
+    if _CPS is None:
+        _CPS = pd.read_csv(os.path.join(tc.Records.CODE_PATH, "cps.csv.gz"))
+    if frac >= 1:
+        return _CPS
+    return _CPS.sample(frac=frac, random_state=123)
+
+
+def warm_defaults():
+    """
+    Build the cached default policy and growth factors, so that parsing
+    them is not timed by whichever benchmark happens to run first
+    """
+    DEFAULTS_CACHE.policy()
+    DEFAULTS_CACHE.growfactors()
+
+
+def make_taxbrain(frac, num_years, behavior=None):
+    """
+    TaxBrain object for the benchmark reform
+    """
+    warm_defaults()
+    end_year = START_YEAR + num_years - 1
+    return TaxBrain(START_YEAR, end_year, microdata=cps_sample(frac),
+                    use_cps=True, reform=REFORM, behavior=behavior)
+
+
+def run_taxbrain(frac, num_years, behavior=None):
+    """
+    TaxBrain object for the benchmark reform that has already been run
+    """
+    tb = make_taxbrain(frac, num_years, behavior)
+    tb.run()
+    return tb
@@ -4,13 +4,12 @@ import json
 import traceback
 import paramtools
 import pandas as pd
-import taxcalc
 import cs2tc
 from .constants import MetaParameters
 from .helpers import (TCDIR,
                       postprocess, nth_year_results, retrieve_puf,)
 from .outputs import create_layout, aggregate_plot
-from taxbrain import TaxBrain, report
+from taxbrain import TaxBrain, report, DEFAULTS_CACHE
 from dask import delayed, compute
 from collections import defaultdict, OrderedDict
 from marshmallow import fields
@@ -52,7 +51,7 @@ def get_inputs(meta_params_dict):
         if meta_params.data_source == "CPS" and meta_params.year < 2014:
             meta_params.adjust({"year": 2014})
 
-    policy_params = taxcalc.Policy()
+    policy_params = DEFAULTS_CACHE.policy()
     policy_params.set_state(year=meta_params.year.tolist())
 
     policy_defaults = cs2tc.convert_policy_defaults(meta_params, policy_params)
@@ -77,7 +76,7 @@ def validate_inputs(meta_params_dict, adjustment, errors_warnings):
     errors_warnings["policy"]["errors"].update(meta_params.errors)
 
     pol_params = cs2tc.convert_policy_adjustment(adjustment["policy"])
-    policy_params = taxcalc.Policy()
+    policy_params = DEFAULTS_CACHE.policy()
     policy_params.adjust(pol_params, raise_errors=False, ignore_warnings=True)
     errors_warnings["policy"]["errors"].update(policy_params.errors)
 
@@ -128,17 +127,18 @@ def run_model(meta_params_dict, adjustment):
         full_sample = pd.read_csv(input_path)
 
     if meta_params.use_full_sample:
-        sample = full_sample
+        sampling_frac = None
         end_year = min(start_year + 10, TaxBrain.LAST_BUDGET_YEAR)
     else:
-        sample = full_sample.sample(frac=sampling_frac,
-                                    random_state=sampling_seed)
         end_year = start_year
 
-    tb = TaxBrain(start_year, end_year, microdata=sample,
+    # the sample is stratified by filing status and income
+    tb = TaxBrain(start_year, end_year, microdata=full_sample,
                   use_cps=use_cps,
                   reform=policy_mods,
-                  behavior=behavior_mods)
+                  behavior=behavior_mods,
+                  sample=sampling_frac,
+                  sample_seed=sampling_seed)
     tb.run()
 
     # Collect results for each year
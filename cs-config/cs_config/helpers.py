@@ -77,7 +77,7 @@ def random_seed(user_mods, year):
 NUM_TO_FUZZ = 3  # when using dropq algorithm on puf.csv results
 
 
-def fuzzed(df1, df2, reform_affected, table_row_type):
+def fuzzed(df1, df2, reform_affected, table_row_type, table_row=None):
     """
     Create fuzzed df2 dataframe and corresponding unfuzzed df1 dataframe.
 
@@ -98,6 +98,11 @@ def fuzzed(df1, df2, reform_affected, table_row_type):
     table_row_type: string
         valid values are 'aggr', 'xbin', and 'xdec'
 
+    table_row: numpy array (not changed by this function)
+        precomputed table row of each filing unit, such as the income groups
+        held by a TaxBrain object. If None, the table rows are computed
+        from baseline expanded income
+
     Returns
     -------
     df1, df2: Pandas DataFrames
@@ -112,7 +117,11 @@ def fuzzed(df1, df2, reform_affected, table_row_type):
     # add copy of reform_affected to df2
     df2['reform_affected'] = copy.deepcopy(reform_affected)
     # construct table rows, for which filing units in each row must be fuzzed
-    if table_row_type == 'xbin':
+    if table_row is not None and table_row_type != 'aggr':
+        assert table_row.size == len(df1.index)
+        df1['table_row'] = copy.deepcopy(table_row)
+        df2['table_row'] = df1['table_row']
+    elif table_row_type == 'xbin':
         df1 = add_income_table_row_variable(df1, 'expanded_income',
                                             STANDARD_INCOME_BINS)
         df2['expanded_income_baseline'] = df1['expanded_income']
@@ -179,12 +188,18 @@ def nth_year_results(tb, year, user_mods, fuzz, return_html=True):
         sres = summary_aggregate(sres, tb)
         del agg1
         del agg2
-        dv1b, dv2b = fuzzed(dv1, dv2, reform_affected, 'xbin')
+        dv1b, dv2b = fuzzed(
+            dv1, dv2, reform_affected, 'xbin',
+            tb.groups.labels(year, 'standard_income_bins')
+        )
         sres = summary_dist_xbin(sres, tb, year)
         sres = summary_diff_xbin(sres, tb, year)
         del dv1b
         del dv2b
-        dv1d, dv2d = fuzzed(dv1, dv2, reform_affected, 'xdec')
+        dv1d, dv2d = fuzzed(
+            dv1, dv2, reform_affected, 'xdec',
+            tb.groups.labels(year, 'weighted_deciles')
+        )
         sres = summary_dist_xdec(sres, tb, year)
         sres = summary_diff_xdec(sres, tb, year)
         del dv1d
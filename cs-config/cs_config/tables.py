@@ -60,12 +60,9 @@ def summary_dist_xbin(res, tb, year):
                                               "expanded_income", "base")
     # reform distribution table
     # ensure income is grouped on the same measure
-    expanded_income_baseline = tb.base_data[year]["expanded_income"]
-    tb.reform_data[year]["expanded_income_baseline"] = expanded_income_baseline
     res["dist2_xbin"] = tb.distribution_table(year, "standard_income_bins",
                                               "expanded_income_baseline",
                                               "reform")
-    del tb.reform_data[year]["expanded_income_baseline"]
     return res
 
 
@@ -122,12 +119,9 @@ def summary_dist_xdec(res, tb, year):
                                               "expanded_income", "base")
     # reform distribution table
     # ensure income is grouped on the same measure
-    expanded_income_baseline = tb.base_data[year]["expanded_income"]
-    tb.reform_data[year]["expanded_income_baseline"] = expanded_income_baseline
     res["dist2_xdec"] = tb.distribution_table(year, "weighted_deciles",
                                               "expanded_income_baseline",
                                               "reform")
-    del tb.reform_data[year]["expanded_income_baseline"]
     return res
 
 
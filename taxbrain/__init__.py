@@ -1,4 +1,10 @@
 from taxbrain.taxbrain import *
+from taxbrain.results import *
+from taxbrain.groups import *
+from taxbrain.sampling import *
+from taxbrain.cache import *
+from taxbrain.hooks import *
+from taxbrain.microdata import *
 from taxbrain.utils import *
 from taxbrain.cli import *
 from taxbrain.report import *
@@ -0,0 +1,398 @@
+"""
+Caching of baseline results and default Tax-Calculator objects across
+TaxBrain runs and checkpointing of the results of a single run
+"""
+import os
+import copy
+import json
+import hashlib
+import threading
+import pandas as pd
+import taxcalc as tc
+from pathlib import Path
+from collections import OrderedDict
+
+
+def hash_microdata(microdata) -> str:
+    """
+    Compute a hash of the contents of the micro-data used in a TaxBrain run
+
+    Parameters
+    ----------
+    microdata: str or Pandas DataFrame
+        path to a micro-data file or directory of .npy column files or a
+        DataFrame containing micro-data
+
+    Returns
+    -------
+    str
+        hexadecimal SHA-256 hash of the micro-data
+    """
+    hsh = hashlib.sha256()
+    if isinstance(microdata, pd.DataFrame):
+        hsh.update(json.dumps(list(microdata.columns)).encode("utf-8"))
+        row_hashes = pd.util.hash_pandas_object(microdata, index=True)
+        hsh.update(row_hashes.values.tobytes())
+    elif isinstance(microdata, (str, Path)) and os.path.isfile(microdata):
+        _hash_file(hsh, microdata)
+    elif isinstance(microdata, (str, Path)) and os.path.isdir(microdata):
+        for path in sorted(Path(microdata).glob("*.npy")):
+            hsh.update(path.name.encode("utf-8"))
+            _hash_file(hsh, path)
+    else:
+        # the default data shipped with Tax-Calculator
+        hsh.update(str(microdata).encode("utf-8"))
+    return hsh.hexdigest()
+
+
+def _hash_file(hsh, path):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hsh.update(block)
+
+
+def hash_inputs(*args) -> str:
+    """
+    Compute a hash of JSON serializable TaxBrain inputs
+
+    Parameters
+    ----------
+    args:
+        objects to include in the hash
+
+    Returns
+    -------
+    str
+        hexadecimal SHA-256 hash of the inputs
+    """
+    text = json.dumps(args, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BaselineCache:
+    """
+    Two-tier cache for baseline results. Recently used results are kept in
+    memory and, if a directory is given, results are also written to disk
+    so they can be used by other processes.
+    """
+
+    def __init__(self, maxsize: int = 4):
+        """
+        Constructor for the BaselineCache class
+
+        Parameters
+        ----------
+        maxsize: int
+            maximum number of results kept in memory
+
+        Returns
+        -------
+        None
+        """
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+
+    def get(self, key: str, cache_dir: str = None):
+        """
+        Look up the results stored for a key
+
+        Parameters
+        ----------
+        key: str
+            key the results were stored under
+        cache_dir: str
+            directory to look in if the results are not in memory
+
+        Returns
+        -------
+        dict or None
+            Pandas DataFrame with the results for each year or None if no
+            results have been stored for the key
+        """
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        if cache_dir:
+            path = self._path(key, cache_dir)
+            if path.exists():
+                results = pd.read_pickle(path)
+                self._remember(key, results)
+                return results
+        return None
+
+    def put(self, key: str, results: dict, cache_dir: str = None):
+        """
+        Store results under a key
+
+        Parameters
+        ----------
+        key: str
+            key to store the results under
+        results: dict
+            Pandas DataFrame with the results for each year
+        cache_dir: str
+            directory to also write the results to
+
+        Returns
+        -------
+        None
+        """
+        self._remember(key, results)
+        if cache_dir:
+            path = self._path(key, cache_dir)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first so other processes never read
+            # a partially written file
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            pd.to_pickle(results, tmp_path)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        """
+        Remove all results held in memory
+        """
+        self._results.clear()
+
+    def __contains__(self, key):
+        return key in self._results
+
+    def __len__(self):
+        return len(self._results)
+
+    # ----- private methods -----
+    def _remember(self, key, results):
+        self._results[key] = results
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    @staticmethod
+    def _path(key, cache_dir):
+        return Path(cache_dir, f"baseline_{key}.pkl")
+
+
+# cache shared by all of the TaxBrain objects in a process
+BASELINE_CACHE = BaselineCache()
+
+
+class DefaultsCache:
+    """
+    Cache of the default Tax-Calculator Policy, GrowFactors and GrowDiff
+    objects. Parsing the default parameters takes about a second, so each
+    object is built once per set of growth assumptions and every caller gets
+    its own copy, which can be modified without affecting the cache.
+    """
+
+    def __init__(self, maxsize: int = 4):
+        """
+        Constructor for the DefaultsCache class
+
+        Parameters
+        ----------
+        maxsize: int
+            maximum number of sets of growth assumptions to keep Policy and
+            GrowFactors objects for
+
+        Returns
+        -------
+        None
+        """
+        self.maxsize = maxsize
+        self._growdiff = None
+        self._growfactors = OrderedDict()
+        self._policies = OrderedDict()
+        self._metadata = None
+        self._lock = threading.RLock()
+
+    def growdiff(self) -> tc.GrowDiff:
+        """
+        Return a copy of the default GrowDiff object
+        """
+        with self._lock:
+            if self._growdiff is None:
+                self._growdiff = tc.GrowDiff()
+            return copy.deepcopy(self._growdiff)
+
+    def growfactors(self, growdiff: dict = None) -> tc.GrowFactors:
+        """
+        Return a copy of the default growth factors with a set of growth
+        assumptions applied
+
+        Parameters
+        ----------
+        growdiff: dict
+            growth assumptions applied to the default growth factors
+
+        Returns
+        -------
+        Tax-Calculator GrowFactors object
+        """
+        key = self._key(growdiff)
+        with self._lock:
+            if key not in self._growfactors:
+                gfactors = tc.GrowFactors()
+                if growdiff:
+                    gdiff = self.growdiff()
+                    gdiff.update_growdiff(growdiff)
+                    gdiff.apply_to(gfactors)
+                self._remember(self._growfactors, key, gfactors)
+            self._growfactors.move_to_end(key)
+            return copy.deepcopy(self._growfactors[key])
+
+    def policy(self, growdiff: dict = None) -> tc.Policy:
+        """
+        Return a copy of current law policy indexed with the growth factors
+        for a set of growth assumptions
+
+        Parameters
+        ----------
+        growdiff: dict
+            growth assumptions applied to the default growth factors
+
+        Returns
+        -------
+        Tax-Calculator Policy object
+        """
+        key = self._key(growdiff)
+        with self._lock:
+            if key not in self._policies:
+                policy = tc.Policy(self.growfactors(growdiff))
+                self._remember(self._policies, key, policy)
+            self._policies.move_to_end(key)
+            return copy.deepcopy(self._policies[key])
+
+    def policy_metadata(self) -> dict:
+        """
+        Return a copy of the metadata of the default policy parameters, as
+        given by Policy.metadata(). The metadata are only computed once
+        """
+        with self._lock:
+            if self._metadata is None:
+                policy = self._policies.get(self._key(None))
+                if policy is None:
+                    policy = self.policy()
+                self._metadata = policy.metadata()
+            return copy.deepcopy(self._metadata)
+
+    def clear(self):
+        """
+        Remove all cached objects
+        """
+        with self._lock:
+            self._growdiff = None
+            self._growfactors.clear()
+            self._policies.clear()
+            self._metadata = None
+
+    # ----- private methods -----
+    def _remember(self, cache, key, obj):
+        cache[key] = obj
+        while len(cache) > self.maxsize:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def _key(growdiff):
+        return hash_inputs(growdiff or {})
+
+
+# default objects shared by all of the TaxBrain objects in a process
+DEFAULTS_CACHE = DefaultsCache()
+
+
+class Checkpoint:
+    """
+    Results of a run saved to disk one year and scenario at a time, so a run
+    that is interrupted can pick up where it left off. The directory holds a
+    manifest with the hash of the run's inputs and a file for each finished
+    year and scenario, named '<year>_<scenario>.pkl'. Results saved for
+    different inputs are removed when the checkpoint is opened. Other files
+    in the directory are left alone.
+    """
+
+    MANIFEST = "manifest.json"
+    SCENARIOS = ("base", "reform")
+
+    def __init__(self, checkpoint_dir: str, key: str):
+        """
+        Constructor for the Checkpoint class
+
+        Parameters
+        ----------
+        checkpoint_dir: str
+            directory the results are saved in
+        key: str
+            hash of the inputs to the run
+
+        Returns
+        -------
+        None
+        """
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.key = key
+
+    def open(self) -> dict:
+        """
+        Prepare the checkpoint directory and load the results already saved
+        for the same inputs
+
+        Returns
+        -------
+        dict
+            Pandas DataFrame with the saved results for each (year,
+            scenario) pair
+        """
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.checkpoint_dir / self.MANIFEST
+        manifest = {}
+        if manifest_path.exists():
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        if manifest.get("inputs") != self.key:
+            # results from a run with different inputs
+            for path, _, _ in self._files():
+                path.unlink()
+            tmp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"inputs": self.key}, f)
+            os.replace(tmp_path, manifest_path)
+            return {}
+        results = {}
+        for path, year, scenario in self._files():
+            results[(year, scenario)] = pd.read_pickle(path)
+        return results
+
+    def save(self, year: int, scenario: str, df: pd.DataFrame):
+        """
+        Save the results for a year and scenario
+
+        Parameters
+        ----------
+        year: int
+            year of the results
+        scenario: str
+            scenario of the results, 'base' or 'reform'
+        df: Pandas DataFrame
+            results to save
+
+        Returns
+        -------
+        None
+        """
+        path = self.checkpoint_dir / f"{year}_{scenario}.pkl"
+        # write to a temporary file first so a run that is killed never
+        # leaves a partially written file behind
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        pd.to_pickle(df, tmp_path)
+        os.replace(tmp_path, path)
+
+    # ----- private methods -----
+    def _files(self):
+        """
+        Find the files in the directory with saved results, along with the
+        year and scenario of each
+        """
+        for scenario in self.SCENARIOS:
+            for path in self.checkpoint_dir.glob(f"[0-9]*_{scenario}.pkl"):
+                year = path.stem[:-len(scenario) - 1]
+                if year.isdigit():
+                    yield path, int(year), scenario
@@ -146,7 +146,8 @@ def cli_main():
         "--data",
         help=(
             "The file path to a micro-dataset that is formatted for use in "
-            "Tax-Calculator."
+            "Tax-Calculator. Parquet and Arrow IPC files and directories of "
+            ".npy column files are memory mapped."
         ),
         default=None
     )
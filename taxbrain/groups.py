@@ -0,0 +1,590 @@
+"""
+Income groups used to build the distribution and difference tables
+"""
+import numpy as np
+import pandas as pd
+from taxcalc.utils import (DIST_TABLE_COLUMNS, DIFF_TABLE_COLUMNS,
+                           DECILE_ROW_NAMES, STANDARD_ROW_NAMES,
+                           STANDARD_INCOME_BINS, SOI_AGI_BINS)
+
+
+GROUPBY_OPTIONS = ["weighted_deciles", "standard_income_bins", "soi_agi_bins"]
+# income bins used for each groupby option that uses fixed bins
+INCOME_BINS = {
+    "standard_income_bins": STANDARD_INCOME_BINS,
+    "soi_agi_bins": SOI_AGI_BINS
+}
+# weighted deciles with the bottom decile split into negative, zero, and
+# positive income and the top decile split into 90-95, 95-99, and top 1%
+NUM_DECILE_GROUPS = 14
+
+
+class IncomeGroups:
+    """
+    Sort orders and income group labels for the results held in a
+    ResultsStore.
+
+    Each sort order and set of labels is computed once and reused until the
+    results it depends on change. Records are sorted the same way Pandas
+    sorts them in Tax-Calculator's table functions so that records with
+    tied incomes land in the same groups and the tables match exactly.
+    """
+
+    def __init__(self, store):
+        """
+        Constructor for the IncomeGroups class
+
+        Parameters
+        ----------
+        store: ResultsStore
+            store holding the results the groups are computed from
+
+        Returns
+        -------
+        None
+        """
+        self.store = store
+        self._orders = {}
+        self._bins = {}
+        self._labels = {}
+
+    def order(self, year: int, var: str = "expanded_income",
+              scenario: str = "base",
+              pop_quantiles: bool = False) -> np.ndarray:
+        """
+        Permutation that sorts the records by a variable
+
+        Parameters
+        ----------
+        year: int
+            year of results to sort
+        var: str
+            variable to sort the records by
+        scenario: str
+            scenario of results to sort, 'base' or 'reform'
+        pop_quantiles: bool
+            whether the variable is divided by the square root of the number
+            of people in each tax unit before sorting, as is done when
+            weighted deciles hold an equal number of people
+
+        Returns
+        -------
+        Numpy array
+            indices of the records in ascending order of the variable
+        """
+        key = (var, scenario, pop_quantiles, year)
+        version = self.store.version(year, scenario)
+        if key in self._orders and self._orders[key][0] == version:
+            return self._orders[key][1]
+        values = self._sort_values(year, var, scenario, pop_quantiles)
+        order = np.argsort(values)
+        self._orders[key] = (version, order)
+        return order
+
+    def bins(self, year: int, var: str, bin_edges: list,
+             scenario: str = "base", right: bool = False) -> np.ndarray:
+        """
+        Bin of each record based on the value of a variable
+
+        Parameters
+        ----------
+        year: int
+            year of results to place in bins
+        var: str
+            variable used to place the records in bins
+        bin_edges: list
+            edges of the bins in ascending order
+        scenario: str
+            scenario of results to use, 'base' or 'reform'
+        right: bool
+            whether the bins include their right edge. If False, bins
+            include their left edge
+
+        Returns
+        -------
+        Numpy array
+            integer label of each record's bin, starting at zero. Records
+            that fall outside of all bins are labeled -1
+        """
+        key = (var, tuple(bin_edges), right, scenario, year)
+        version = self.store.version(year, scenario)
+        if key in self._bins and self._bins[key][0] == version:
+            return self._bins[key][1]
+        values = self.store.frame(year, scenario)[var].values
+        labels = bin_labels(values, bin_edges, right)
+        self._bins[key] = (version, labels)
+        return labels
+
+    def labels(self, year: int, groupby: str, scenario: str = "base",
+               pop_quantiles: bool = False) -> np.ndarray:
+        """
+        Income group of each record, based on expanded income
+
+        Parameters
+        ----------
+        year: int
+            year of results to group
+        groupby: str
+            how the records are grouped
+            options: 'weighted_deciles', 'standard_income_bins',
+            'soi_agi_bins'
+        scenario: str
+            scenario whose expanded income is used, 'base' or 'reform'
+        pop_quantiles: bool
+            whether weighted deciles contain an equal number of tax units
+            (False) or people (True)
+
+        Returns
+        -------
+        Numpy array
+            integer label of each record's group, starting at zero. Records
+            that fall outside of all groups are labeled -1
+        """
+        if groupby not in GROUPBY_OPTIONS:
+            raise ValueError(f"groupby must be one of {GROUPBY_OPTIONS}")
+        if pop_quantiles and groupby != "weighted_deciles":
+            raise ValueError(
+                "pop_quantiles can only be used with weighted_deciles"
+            )
+        if groupby != "weighted_deciles":
+            return self.bins(year, "expanded_income", INCOME_BINS[groupby],
+                             scenario)
+        key = (scenario, pop_quantiles, year)
+        version = self.store.version(year, scenario)
+        if key in self._labels and self._labels[key][0] == version:
+            return self._labels[key][1]
+        data = self.store.frame(year, scenario)
+        order = self.order(year, "expanded_income", scenario, pop_quantiles)
+        labels = quantile_labels(data["expanded_income"].values,
+                                 data["s006"].values, data["XTOT"].values,
+                                 order, pop_quantiles)
+        self._labels[key] = (version, labels)
+        return labels
+
+    # ----- private methods -----
+    def _sort_values(self, year, var, scenario, pop_quantiles):
+        """
+        Values used to sort the records
+        """
+        data = self.store.frame(year, scenario)
+        values = data[var].values
+        if pop_quantiles:
+            xtot = data["XTOT"].values
+            values = values / np.sqrt(np.where(xtot == 0, 1, xtot))
+        return values
+
+
+def num_groups(groupby: str) -> int:
+    """
+    Number of income groups used for a groupby option
+    """
+    if groupby == "weighted_deciles":
+        return NUM_DECILE_GROUPS
+    return len(INCOME_BINS[groupby]) - 1
+
+
+def bin_labels(values: np.ndarray, bin_edges: list,
+               right: bool = False) -> np.ndarray:
+    """
+    Label each record with the income bin it falls in
+
+    Parameters
+    ----------
+    values: Numpy array
+        values used to place each record in a bin
+    bin_edges: list
+        edges of the bins in ascending order
+    right: bool
+        whether the bins include their right edge. If False, bins include
+        their left edge
+
+    Returns
+    -------
+    Numpy array
+        bin of each record, starting at zero. Records outside of all bins
+        are labeled -1
+    """
+    side = "left" if right else "right"
+    labels = np.searchsorted(bin_edges, values, side=side) - 1
+    labels[(labels < 0) | (labels >= len(bin_edges) - 1)] = -1
+    return labels
+
+
+def quantile_labels(income: np.ndarray, s006: np.ndarray, xtot: np.ndarray,
+                    order: np.ndarray,
+                    pop_quantiles: bool = False) -> np.ndarray:
+    """
+    Label each record with its weighted decile. The bottom decile is split
+    into records with negative, zero, and positive income and the top
+    decile is split into the 90-95, 95-99, and top 1% groups, matching the
+    deciles used in Tax-Calculator's tables.
+
+    Parameters
+    ----------
+    income: Numpy array
+        income used to rank the records
+    s006: Numpy array
+        record weights
+    xtot: Numpy array
+        number of people in each record
+    order: Numpy array
+        permutation that sorts the records by income, or by income divided
+        by the square root of the number of people in the record if
+        pop_quantiles is True
+    pop_quantiles: bool
+        whether the deciles contain an equal number of tax units (False) or
+        people (True)
+
+    Returns
+    -------
+    Numpy array
+        group of each record, from 0 to 13
+    """
+    if pop_quantiles:
+        weights = xtot * s006
+    else:
+        weights = s006
+    cumsum = np.cumsum(weights[order])
+    bin_width = cumsum[-1] / 10.
+    bin_edges = list(np.arange(0, 11) * bin_width)
+    bin_edges[-1] = 9e99
+    bin_edges[0] = -9e99
+    # weights are summed in sorted order, as Tax-Calculator does, so that
+    # records whose cumulative weight sits on a group's edge are placed in
+    # the same group
+    sorted_s006 = s006[order]
+    sorted_income = income[order]
+    neg_wght = sorted_s006[sorted_income <= -1e-9].sum()
+    zer_wght = sorted_s006[(sorted_income > -1e-9) &
+                           (sorted_income < 1e-9)].sum()
+    bin_edges.insert(1, neg_wght + zer_wght)  # top of zeros
+    bin_edges.insert(1, neg_wght)  # top of negatives
+    bin_edges.insert(-1, bin_edges[-2] + 0.5 * bin_width)  # top of 90-95
+    bin_edges.insert(-1, bin_edges[-2] + 0.4 * bin_width)  # top of 95-99
+    labels = np.empty(len(order), dtype=np.int64)
+    labels[order] = bin_labels(cumsum, bin_edges)
+    return labels
+
+
+def group_sums(labels: np.ndarray, values: np.ndarray,
+               num_groups: int) -> np.ndarray:
+    """
+    Sum values within each group
+
+    Parameters
+    ----------
+    labels: Numpy array
+        group of each record. Records labeled -1 are left out
+    values: Numpy array
+        values to sum
+    num_groups: int
+        number of groups
+
+    Returns
+    -------
+    Numpy array
+        sum of the values in each group
+    """
+    valid = labels >= 0
+    if not valid.all():
+        labels = labels[valid]
+        values = values[valid]
+    return np.bincount(labels, weights=values, minlength=num_groups)
+
+
+def grouped_distribution_table(data: pd.DataFrame, labels: np.ndarray,
+                               groupby: str,
+                               pop_quantiles: bool = False) -> pd.DataFrame:
+    """
+    Create a distribution table from records that have already been placed
+    in income groups. The table matches the one created by Tax-Calculator's
+    create_distribution_table function.
+
+    Parameters
+    ----------
+    data: Pandas DataFrame
+        results including the variables in taxcalc.DIST_VARIABLES
+    labels: Numpy array
+        income group of each record
+    groupby: str
+        groupby option used to create the labels
+    pop_quantiles: bool
+        whether weighted deciles contain an equal number of tax units
+        (False) or people (True)
+
+    Returns
+    -------
+    table: Pandas DataFrame
+        distribution table
+    """
+    ngroups = num_groups(groupby)
+    values = _distribution_values(data, pop_quantiles)
+    sums = {
+        col: group_sums(labels, values[col], ngroups) for col in values
+    }
+    table = _add_sum_rows(pd.DataFrame(sums), groupby)
+    return _scale_distribution_table(table)
+
+
+def grouped_distribution_se(data: pd.DataFrame, labels: np.ndarray,
+                            groupby: str, sample,
+                            pop_quantiles: bool = False) -> pd.DataFrame:
+    """
+    Estimate the standard errors of the cells of a distribution table
+    created from a stratified sample of the records. The income groups are
+    taken as given, so the uncertainty in where the group boundaries fall
+    is left out
+
+    Parameters
+    ----------
+    data: Pandas DataFrame
+        results including the variables in taxcalc.DIST_VARIABLES
+    labels: Numpy array
+        income group of each record
+    groupby: str
+        groupby option used to create the labels
+    sample: StratifiedSample
+        sample the results were computed from
+    pop_quantiles: bool
+        whether weighted deciles contain an equal number of tax units
+        (False) or people (True)
+
+    Returns
+    -------
+    table: Pandas DataFrame
+        standard error of each cell in the distribution table, in the same
+        units as the table
+    """
+    values = _distribution_values(data, pop_quantiles)
+    table = _grouped_standard_errors(values, data["s006"].values, labels,
+                                     groupby, sample)
+    return _scale_distribution_table(table)
+
+
+def grouped_difference_table(base: pd.DataFrame, reform: pd.DataFrame,
+                             labels: np.ndarray, groupby: str,
+                             tax_to_diff: str,
+                             pop_quantiles: bool = False) -> pd.DataFrame:
+    """
+    Create a differences table from records that have already been placed
+    in income groups. The table matches the one created by Tax-Calculator's
+    create_difference_table function.
+
+    Parameters
+    ----------
+    base: Pandas DataFrame
+        baseline results including the variables in taxcalc.DIFF_VARIABLES
+    reform: Pandas DataFrame
+        reform results including the variables in taxcalc.DIFF_VARIABLES
+    labels: Numpy array
+        income group of each record, based on baseline expanded income
+    groupby: str
+        groupby option used to create the labels
+    tax_to_diff: str
+        which tax to take the difference of
+        options: 'iitax', 'payrolltax', 'combined'
+    pop_quantiles: bool
+        whether weighted deciles contain an equal number of tax units
+        (False) or people (True)
+
+    Returns
+    -------
+    table: Pandas DataFrame
+        differences table
+    """
+    ngroups = num_groups(groupby)
+    values = _difference_values(base, reform, tax_to_diff, pop_quantiles)
+    sums = {
+        col: group_sums(labels, values[col], ngroups) for col in values
+    }
+    table = _add_sum_rows(pd.DataFrame(sums), groupby)
+    # compute non-additive statistics in each table cell
+    count = table["count"].values
+    has_count = count > 0
+    table["perc_cut"] = np.divide(
+        100 * table["tax_cut"].values, count,
+        out=np.zeros(len(table.index)), where=has_count
+    )
+    table["perc_inc"] = np.divide(
+        100 * table["tax_inc"].values, count,
+        out=np.zeros(len(table.index)), where=has_count
+    )
+    table["mean"] = np.divide(
+        table["tot_change"].values, count,
+        out=np.zeros(len(table.index)), where=has_count
+    )
+    total_change = table.loc["ALL", "tot_change"]
+    table["share_of_change"] = np.divide(
+        100 * table["tot_change"].values, total_change,
+        out=np.zeros(len(table.index)), where=total_change > 0
+    )
+    atinc1 = table["atinc1"].values
+    quotient = np.divide(
+        table["atinc2"].values, atinc1,
+        out=np.zeros(len(table.index)), where=atinc1 != 0
+    )
+    table["pc_aftertaxinc"] = np.where(atinc1 == 0., np.nan,
+                                       100 * (quotient - 1))
+    table = table.reindex(columns=DIFF_TABLE_COLUMNS)
+    return _scale_difference_table(table)
+
+
+def grouped_difference_se(base: pd.DataFrame, reform: pd.DataFrame,
+                          labels: np.ndarray, groupby: str,
+                          tax_to_diff: str, sample,
+                          pop_quantiles: bool = False) -> pd.DataFrame:
+    """
+    Estimate the standard errors of the cells of a differences table
+    created from a stratified sample of the records. Standard errors are
+    given for the cells that are weighted totals. The percentages and means
+    are left as NaN. The income groups are taken as given, so the
+    uncertainty in where the group boundaries fall is left out
+
+    Parameters
+    ----------
+    base: Pandas DataFrame
+        baseline results including the variables in taxcalc.DIFF_VARIABLES
+    reform: Pandas DataFrame
+        reform results including the variables in taxcalc.DIFF_VARIABLES
+    labels: Numpy array
+        income group of each record, based on baseline expanded income
+    groupby: str
+        groupby option used to create the labels
+    tax_to_diff: str
+        which tax to take the difference of
+        options: 'iitax', 'payrolltax', 'combined'
+    sample: StratifiedSample
+        sample the results were computed from
+    pop_quantiles: bool
+        whether weighted deciles contain an equal number of tax units
+        (False) or people (True)
+
+    Returns
+    -------
+    table: Pandas DataFrame
+        standard error of each cell in the differences table, in the same
+        units as the table
+    """
+    values = _difference_values(base, reform, tax_to_diff, pop_quantiles)
+    table = _grouped_standard_errors(values, reform["s006"].values, labels,
+                                     groupby, sample)
+    table = table.reindex(columns=DIFF_TABLE_COLUMNS)
+    return _scale_difference_table(table)
+
+
+def _distribution_values(data, pop_quantiles):
+    """
+    Weighted value of each record for every column of a distribution table
+    """
+    s006 = data["s006"].values
+    if pop_quantiles:
+        count = s006 * data["XTOT"].values
+    else:
+        count = s006
+    counts = {
+        "count": count,
+        "count_StandardDed": np.where(data["standard"].values > 0.,
+                                      count, 0.),
+        "count_ItemDed": np.where(data["c04470"].values > 0., count, 0.),
+        "count_AMT": np.where(data["c09600"].values > 0., count, 0.)
+    }
+    values = {}
+    for col in DIST_TABLE_COLUMNS:
+        if col in counts:
+            values[col] = counts[col]
+        else:
+            values[col] = data[col].values * s006
+    return values
+
+
+def _difference_values(base, reform, tax_to_diff, pop_quantiles):
+    """
+    Weighted value of each record for every column of a differences table
+    that is a weighted total
+    """
+    if tax_to_diff not in ("iitax", "payrolltax", "combined"):
+        raise ValueError(
+            "tax_to_diff must be 'iitax', 'payrolltax', or 'combined'"
+        )
+    s006 = reform["s006"].values
+    if pop_quantiles:
+        count = s006 * reform["XTOT"].values
+    else:
+        count = s006
+    tax_diff = reform[tax_to_diff].values - base[tax_to_diff].values
+    values = {
+        "count": count,
+        "tax_cut": np.where(tax_diff < -0.001, count, 0.),
+        "tax_inc": np.where(tax_diff > 0.001, count, 0.),
+        "tot_change": tax_diff * s006
+    }
+    for col in ["ubi", "benefit_cost_total", "benefit_value_total"]:
+        values[col] = (reform[col].values - base[col].values) * s006
+    values["atinc1"] = base["aftertax_income"].values * s006
+    values["atinc2"] = reform["aftertax_income"].values * s006
+    return values
+
+
+def _grouped_standard_errors(values, weights, labels, groupby, sample):
+    """
+    Estimate the standard errors of the group totals of each set of values,
+    including the rows added by _add_sum_rows
+    """
+    ngroups = num_groups(groupby)
+    errors = {}
+    for col, col_values in values.items():
+        moments = sample.moments(col_values, weights, labels, ngroups)
+        # the sums over the records in each row add up across groups, so
+        # they are combined the same way as the table
+        moments = [
+            _add_sum_rows(pd.DataFrame(layer), groupby) for layer in moments
+        ]
+        variance = sample.variance(np.stack([m.values for m in moments]),
+                                   weights)
+        errors[col] = pd.Series(np.sqrt(variance), index=moments[0].index)
+    return pd.DataFrame(errors)
+
+
+def _scale_distribution_table(table):
+    """
+    Express counts in millions and amounts in billions
+    """
+    for col in table.columns:
+        if col.startswith("count"):
+            table[col] *= 1e-6
+        else:
+            table[col] *= 1e-9
+    return table
+
+
+def _scale_difference_table(table):
+    """
+    Express counts in millions and amounts in billions
+    """
+    for col in ["count", "tax_cut", "tax_inc"]:
+        table[col] *= 1e-6
+    for col in ["tot_change", "ubi", "benefit_cost_total",
+                "benefit_value_total"]:
+        table[col] *= 1e-9
+    return table
+
+
+def _add_sum_rows(table, groupby):
+    """
+    Add the row with totals for all records and, for weighted deciles, the
+    row with totals for the top decile. Rows are named the same way as in
+    Tax-Calculator's tables.
+    """
+    values = table.values
+    sum_row = values.sum(axis=0)
+    if groupby == "weighted_deciles":
+        topdec_row = values[11:].sum(axis=0)
+        values = np.vstack([values[:11], topdec_row, sum_row, values[11:]])
+        index = DECILE_ROW_NAMES
+    else:
+        values = np.vstack([values, sum_row])
+        if groupby == "standard_income_bins":
+            index = STANDARD_ROW_NAMES
+        else:
+            index = list(range(len(table.index))) + ["ALL"]
+    return pd.DataFrame(values, index=index, columns=table.columns)
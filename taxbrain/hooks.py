@@ -0,0 +1,127 @@
+"""
+Instrumentation hooks for the phases of a TaxBrain run
+"""
+import time
+from contextlib import contextmanager
+
+
+PHASES = [
+    "records", "policy", "advance_to_year", "calc_all", "dataframe",
+    "response", "table"
+]
+
+
+class Hooks:
+    """
+    Registry of functions that are called with a structured event at the
+    start and end of each phase of a TaxBrain run. Every event is a
+    dictionary with the keys:
+
+    * 'event': 'start' or 'end'
+    * 'phase': one of PHASES
+    * 'year': year being run, or None if the phase is not for one year
+    * 'scenario': 'base', 'reform', the position of the reform in
+      TaxBrain.run_many(), or None if the phase is not for one scenario
+    * 'time': wall clock time of the event, in seconds since the epoch
+    * 'duration': seconds since the start of the phase. Only in 'end' events
+
+    along with any other tags given for the phase. When a run is split
+    across worker processes, the hooks are called in the workers, so they
+    must be picklable.
+    """
+
+    def __init__(self):
+        """
+        Constructor for the Hooks class
+
+        Returns
+        -------
+        None
+        """
+        self._hooks = []
+
+    def add(self, hook):
+        """
+        Register a function to call with each event
+
+        Parameters
+        ----------
+        hook: callable
+            function that takes an event dictionary as its only argument
+
+        Returns
+        -------
+        None
+        """
+        if not callable(hook):
+            raise TypeError("hook must be callable")
+        self._hooks.append(hook)
+
+    def remove(self, hook):
+        """
+        Stop calling a registered function
+
+        Parameters
+        ----------
+        hook: callable
+            function to remove
+
+        Returns
+        -------
+        None
+        """
+        self._hooks.remove(hook)
+
+    def emit(self, event: dict):
+        """
+        Call every registered function with an event
+
+        Parameters
+        ----------
+        event: dict
+            event to pass to the functions
+
+        Returns
+        -------
+        None
+        """
+        for hook in self._hooks:
+            hook(event)
+
+    @contextmanager
+    def phase(self, phase: str, year: int = None, scenario: str = None,
+              **tags):
+        """
+        Context manager that emits a 'start' event when the block is entered
+        and an 'end' event with the duration of the block when it exits
+
+        Parameters
+        ----------
+        phase: str
+            name of the phase
+        year: int
+            year the phase is for
+        scenario: str
+            scenario the phase is for
+        tags:
+            other values to include in the events
+
+        Returns
+        -------
+        None
+        """
+        if not self._hooks:
+            yield
+            return
+        event = {"phase": phase, "year": year, "scenario": scenario, **tags}
+        self.emit({"event": "start", "time": time.time(), **event})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.emit({"event": "end", "time": time.time(),
+                       "duration": duration, **event})
+
+    def __len__(self):
+        return len(self._hooks)
@@ -0,0 +1,193 @@
+"""
+Reading micro-data stored in columnar formats
+"""
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:
+    pyarrow = None
+
+
+PARQUET_EXTENSIONS = [".parquet", ".pq"]
+ARROW_EXTENSIONS = [".arrow", ".feather", ".ipc"]
+MICRODATA_FORMATS = ["npy", "parquet", "arrow"]
+
+
+def read_microdata(microdata):
+    """
+    Load micro-data stored in a columnar format. Parquet and Arrow IPC files
+    and directories of .npy column files are memory mapped, so loading them
+    is fast and the pages read are shared by every process that loads the
+    same file.
+
+    Parameters
+    ----------
+    microdata: str, Path, or Pandas DataFrame
+        path to a Parquet file, an Arrow IPC (Feather) file, or a directory
+        with one .npy file per variable. Anything else, such as a DataFrame
+        or a path to a CSV file, is returned unchanged so it can be read by
+        Tax-Calculator
+
+    Returns
+    -------
+    Pandas DataFrame or the microdata argument
+        micro-data for Tax-Calculator
+    """
+    if not isinstance(microdata, (str, Path)):
+        return microdata
+    path = Path(microdata)
+    if path.is_dir():
+        return _read_npy_dir(path)
+    suffix = path.suffix.lower()
+    if suffix in PARQUET_EXTENSIONS:
+        _check_pyarrow("Parquet")
+        return pd.read_parquet(path, engine="pyarrow", memory_map=True)
+    if suffix in ARROW_EXTENSIONS:
+        _check_pyarrow("Arrow IPC")
+        table = pyarrow.feather.read_table(path, memory_map=True)
+        return table.to_pandas()
+    return microdata
+
+
+def convert_microdata(csv_path: str, output: str, fmt: str = "npy"):
+    """
+    Convert a Tax-Calculator CSV micro-data file to a columnar format that
+    TaxBrain can load with memory mapping. The conversion only needs to be
+    done once for each file.
+
+    Parameters
+    ----------
+    csv_path: str
+        path to the CSV file
+    output: str
+        path of the file, or for the npy format the directory, to write
+    fmt: str
+        format to write. Options: 'npy', 'parquet', 'arrow'
+
+    Returns
+    -------
+    None
+    """
+    if fmt not in MICRODATA_FORMATS:
+        raise ValueError(f"fmt must be one of {MICRODATA_FORMATS}")
+    data = pd.read_csv(csv_path)
+    if fmt == "npy":
+        os.makedirs(output, exist_ok=True)
+        for col in data.columns:
+            np.save(os.path.join(output, f"{col}.npy"), data[col].values)
+    elif fmt == "parquet":
+        _check_pyarrow("Parquet")
+        data.to_parquet(output, engine="pyarrow", index=False)
+    else:
+        _check_pyarrow("Arrow IPC")
+        # files must be uncompressed to be memory mapped
+        pyarrow.feather.write_feather(data, output,
+                                      compression="uncompressed")
+
+
+def microdata_positions(microdata):
+    """
+    Find the position of each record in the file of sample weights that
+    Tax-Calculator matches with the micro-data
+
+    Parameters
+    ----------
+    microdata: str or Pandas DataFrame
+        path to a CSV file or a DataFrame, as returned by read_microdata()
+
+    Returns
+    -------
+    positions: Numpy array
+        row of the sample weights used for each record
+    """
+    if isinstance(microdata, pd.DataFrame):
+        # Tax-Calculator uses the index of a DataFrame to select weights
+        return np.asarray(microdata.index)
+    num_records = sum(
+        len(chunk)
+        for chunk in pd.read_csv(microdata, usecols=[0], chunksize=100000)
+    )
+    return np.arange(num_records)
+
+
+def microdata_chunks(microdata, chunk_size: int):
+    """
+    Split micro-data into partitions of consecutive records. CSV files are
+    read one partition at a time, and partitions of memory mapped data
+    are views that are only read as they are used
+
+    Parameters
+    ----------
+    microdata: str or Pandas DataFrame
+        path to a CSV file or a DataFrame, as returned by read_microdata()
+    chunk_size: int
+        maximum number of records in each partition
+
+    Yields
+    ------
+    positions: Numpy array
+        row of the sample weights used for each record in the partition
+    chunk: Pandas DataFrame
+        records in the partition
+    """
+    if isinstance(microdata, pd.DataFrame):
+        positions = microdata_positions(microdata)
+        for start in range(0, len(microdata.index), chunk_size):
+            stop = start + chunk_size
+            yield positions[start:stop], microdata.iloc[start:stop]
+    else:
+        start = 0
+        for chunk in pd.read_csv(microdata, chunksize=chunk_size):
+            stop = start + len(chunk.index)
+            yield np.arange(start, stop), chunk
+            start = stop
+
+
+def read_partition(microdata, start: int, stop: int):
+    """
+    Read a partition of consecutive records of micro-data. Memory mapped
+    formats only read the pages used by the partition
+
+    Parameters
+    ----------
+    microdata: str, Path, or Pandas DataFrame
+        anything accepted by read_microdata(), or a path to a CSV file
+    start: int
+        position of the first record in the partition
+    stop: int
+        position after the last record in the partition
+
+    Returns
+    -------
+    Pandas DataFrame
+        records in the partition
+    """
+    data = read_microdata(microdata)
+    if isinstance(data, pd.DataFrame):
+        return data.iloc[start:stop]
+    return pd.read_csv(data, skiprows=range(1, start + 1),
+                       nrows=stop - start)
+
+
+def _read_npy_dir(path):
+    """
+    Load a directory of .npy column files
+    """
+    files = sorted(path.glob("*.npy"))
+    if not files:
+        raise ValueError(f"{path} does not contain any .npy files")
+    columns = {
+        npy_file.stem: np.load(npy_file, mmap_mode="r") for npy_file in files
+    }
+    return pd.DataFrame(columns, copy=False)
+
+
+def _check_pyarrow(fmt):
+    if pyarrow is None:
+        raise ImportError(
+            f"pyarrow must be installed to read or write {fmt} micro-data"
+        )
@@ -3,6 +3,7 @@ import behresp
 import taxbrain
 import taxcalc as tc
 from pathlib import Path
+from .cache import DEFAULTS_CACHE
 from .report_utils import (form_intro, form_baseline_intro, write_text, date,
                            largest_tax_change, notable_changes,
                            behavioral_assumptions, consumption_assumptions,
@@ -16,7 +17,7 @@ CUR_PATH = Path(__file__).resolve().parent
 
 def report(tb, name=None, change_threshold=0.05, description=None,
            outdir=None, author="", css=None,
-           verbose=False, clean=False):
+           verbose=False, clean=False, pdf=True):
     """
     Create a PDF report based on TaxBrain results
 
@@ -43,6 +44,9 @@ def report(tb, name=None, change_threshold=0.05, description=None,
     clean: bool
         boolean indicating whether all of the files written to create the
         report should be deleated and a byte representation of the PDF returned
+    pdf: bool
+        boolean indicating whether the Markdown report should be converted
+        to a PDF. If False, only the Markdown version is written
 
     Returns
     --------
@@ -128,8 +132,7 @@ def report(tb, name=None, change_threshold=0.05, description=None,
     if verbose:
         print("Writing Introduction")
     # find policy areas used in the reform
-    pol = tc.Policy()
-    pol_meta = pol.metadata()
+    pol_meta = DEFAULTS_CACHE.policy_metadata()
     pol_areas = set()
     for var in tb.params["policy"].keys():
         # catch "{}-indexed" parameter changes
@@ -269,15 +272,14 @@ def report(tb, name=None, change_threshold=0.05, description=None,
     pdf_path = Path(output_path, f"{filename}.pdf")
     md_path = Path(output_path, f"{filename}.md")
     md_path.write_text(report_md)
-    md_to_pdf(report_md, str(pdf_path))
+    if pdf:
+        md_to_pdf(report_md, str(pdf_path))
 
     if clean:
         # return PDF as bytes and the markdown text
-        byte_pdf = pdf_path.read_bytes()
-        files = {
-            f"{filename}.md": report_md,
-            f"{filename}.pdf": byte_pdf
-        }
+        files = {f"{filename}.md": report_md}
+        if pdf:
+            files[f"{filename}.pdf"] = pdf_path.read_bytes()
         # remove directory where everything was saved
         shutil.rmtree(output_path)
         assert not output_path.exists()
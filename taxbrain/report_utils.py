@@ -2,17 +2,17 @@
 Helper Functions for creating the automated reports
 """
 import json
-import pypandoc
 import numpy as np
 import pandas as pd
 import taxcalc as tc
-from jinja2 import Template
 from pathlib import Path
 from datetime import datetime
-from tabulate import tabulate
 from collections import defaultdict, deque
 from .utils import is_paramtools_format
+from .cache import DEFAULTS_CACHE
 from typing import Union
+# pypandoc, jinja2 and tabulate are imported inside the functions that use
+# them so they are only loaded when a report is made
 
 
 CUR_PATH = Path(__file__).resolve().parent
@@ -61,6 +61,7 @@ def md_to_pdf(md_text, outputfile_path):
         Markdown text is saved as a PDF and the HTML used to create
         the report
     """
+    import pypandoc
     # convert markdown text to pdf with pandoc
     pypandoc.convert_text(
         md_text, 'pdf', format='md', outputfile=outputfile_path,
@@ -83,6 +84,7 @@ def convert_table(df, tablefmt: str = "pipe") -> str:
     str
         String that is a formatted markdown table
     """
+    from tabulate import tabulate
     if isinstance(df, pd.DataFrame):
         return tabulate(
             df, headers="keys", tablefmt=tablefmt
@@ -128,7 +130,9 @@ def policy_table(params):
     reform_by_year = defaultdict(lambda: deque())
     if is_paramtools_format(params):
         params = convert_params(params)
-    pol = tc.Policy()  # policy object used for getting original value
+    # policy object used for getting original value
+    pol = DEFAULTS_CACHE.policy()
+    pol_meta_all = DEFAULTS_CACHE.policy_metadata()
     # loop through all of the policy parameters in a given reform
     for param, meta in params.items():
         # find all the years the parameter is updated
@@ -139,7 +143,7 @@ def policy_table(params):
             pol.set_year(yr)
             if param.endswith("-indexed"):
                 _param = param.split("-")[0]
-                pol_meta = pol.metadata()[_param]
+                pol_meta = pol_meta_all[_param]
                 default_indexed = pol_meta["indexed"]
                 new_indexed = meta[yr]
                 name = pol_meta["title"]
@@ -148,7 +152,7 @@ def policy_table(params):
                      f"CPI Indexed: {new_indexed}"]
                 )
                 continue
-            pol_meta = pol.metadata()[param]
+            pol_meta = pol_meta_all[param]
             name = pol_meta["title"]
             default_val = getattr(pol, param)
             new_val = meta[yr]
@@ -205,6 +209,7 @@ def write_text(template_path, **kwargs):
     rendered: str
         rendered template
     """
+    from jinja2 import Template
     template_str = Path(template_path).open("r").read()
     template = Template(template_str)
     rendered = template.render(**kwargs)
@@ -542,12 +547,9 @@ def growth_assumptions(tb):
         growdiff_by_year = defaultdict(lambda: deque())
 
         # base GrowFactor object to pull default values
-        base_gf = tc.GrowFactors()
-        # create GrowDiff and GrowFactors for the new assumptions
-        reform_gd = tc.GrowDiff()
-        reform_gd.update_growdiff(params)
-        reform_gf = tc.GrowFactors()
-        reform_gd.apply_to(reform_gf)
+        base_gf = DEFAULTS_CACHE.growfactors()
+        # GrowFactors for the new assumptions
+        reform_gf = DEFAULTS_CACHE.growfactors(params)
         # loop through all of the reforms
         for param, meta in params.items():
             # find all years a new value is specified
@@ -592,7 +594,7 @@ def convert_params(params):
     reform: dict
         a dictionary in traditional taxcalc style
     """
-    pol = tc.Policy()
+    pol = DEFAULTS_CACHE.policy()
     pol.adjust(params)
     indexed_params = []
     reform = defaultdict(dict)
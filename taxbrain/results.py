@@ -0,0 +1,468 @@
+"""
+Storage for the results of a TaxBrain run
+"""
+import os
+import numpy as np
+import pandas as pd
+import taxcalc as tc
+from pathlib import Path
+from collections.abc import MutableMapping
+
+
+RESULT_DTYPES = ["float64", "compact"]
+# variables Tax-Calculator treats as integers, such as MARS and XTOT
+INTEGER_VARIABLES = frozenset(tc.Records(data=None).INTEGER_VARS)
+# variables kept in double precision in compact results
+WEIGHT_VARIABLES = frozenset(["s006"])
+
+
+class ResultsStore:
+    """
+    Columnar store for the per-year results of the baseline and reform
+    calculators.
+
+    All of the results are kept in a single array with the dimensions
+    variables x years x records x scenarios, so the values of each variable
+    are one contiguous years x records x scenarios block. The results for
+    a given year and scenario are returned as a Pandas DataFrame that is a
+    read-only view on the store rather than a copy. Results are changed by
+    storing new ones, so the weighted sums and any tables computed from
+    them are never out of date.
+
+    Weighted sums are computed for every variable, year and scenario at once
+    and kept until new results are stored.
+
+    With compact results, variables are grouped by data type and each group
+    is kept in its own array: integer variables use the smallest integer
+    type that holds their values, weights stay in double precision and all
+    other variables are single precision. If later results for an integer
+    variable do not fit in its type, the variable is moved to a wider one.
+    Weighted sums are still accumulated in double precision.
+
+    If a directory is given, the arrays are memory mapped files in that
+    directory, so results larger than memory can be stored. Results can
+    also be written one partition of the records at a time with
+    set_rows(), which writes straight into the store.
+    """
+
+    SCENARIOS = ["base", "reform"]
+
+    def __init__(self, years, result_dtype: str = "float64",
+                 directory: str = None):
+        """
+        Constructor for the ResultsStore class
+
+        Parameters
+        ----------
+        years: list
+            years that results will be stored for
+        result_dtype: str
+            how the results are stored. Options: 'float64', 'compact'
+        directory: str
+            if given, the results are kept in memory mapped files in this
+            directory rather than in memory
+
+        Returns
+        -------
+        None
+        """
+        if result_dtype not in RESULT_DTYPES:
+            raise ValueError(f"result_dtype must be one of {RESULT_DTYPES}")
+        self.years = list(years)
+        self.result_dtype = result_dtype
+        self.directory = Path(directory) if directory else None
+        self.variables = []
+        self._var_index = {}
+        # array of the variables with each data type, the position of each
+        # variable in those arrays, and the variables in each array
+        self._blocks = {}
+        self._locations = {}
+        self._block_vars = {}
+        # weighted sums of all variables for each weight variable
+        self._sums = {}
+        self._filled = np.zeros((len(self.years), len(self.SCENARIOS)),
+                                dtype=bool)
+        # number of records written for each year and scenario
+        self._rows = np.zeros((len(self.years), len(self.SCENARIOS)),
+                              dtype=np.int64)
+        # number of times the results for each year and scenario have changed
+        self._versions = np.zeros((len(self.years), len(self.SCENARIOS)),
+                                  dtype=np.int64)
+
+    @property
+    def num_records(self) -> int:
+        """
+        Number of records stored for each year and scenario
+        """
+        if not self._blocks:
+            return 0
+        return next(iter(self._blocks.values())).shape[2]
+
+    def has_year(self, year: int, scenario: str) -> bool:
+        """
+        Check if results have been stored for a given year and scenario
+        """
+        if year not in self.years:
+            return False
+        return bool(self._filled[self._year_index(year),
+                                 self._scenario_index(scenario)])
+
+    def version(self, year: int, scenario: str) -> int:
+        """
+        Counter that changes every time the results for a year and scenario
+        are stored or cleared. Used to tell if values derived from the
+        results are still valid.
+        """
+        return int(self._versions[self._year_index(year),
+                                  self._scenario_index(scenario)])
+
+    def set_frame(self, year: int, scenario: str, df: pd.DataFrame):
+        """
+        Store the results for a year and scenario
+
+        Parameters
+        ----------
+        year: int
+            year the results are for
+        scenario: str
+            scenario the results are for, 'base' or 'reform'
+        df: Pandas DataFrame
+            results to store. The first DataFrame stored determines the
+            variables and number of records kept in the store
+
+        Returns
+        -------
+        None
+        """
+        if not self._blocks:
+            self._allocate(list(df.columns), len(df.index), df)
+        if len(df.index) != self.num_records:
+            msg = (f"Results for {year} have {len(df.index)} records. "
+                   f"Expected {self.num_records}.")
+            raise ValueError(msg)
+        self._write(year, scenario, df, 0)
+
+    def set_rows(self, year: int, scenario: str, df: pd.DataFrame,
+                 start: int, num_records: int = None):
+        """
+        Store the results for a partition of consecutive records for a year
+        and scenario. The results for the year and scenario are available
+        once every record has been written
+
+        Parameters
+        ----------
+        year: int
+            year the results are for
+        scenario: str
+            scenario the results are for, 'base' or 'reform'
+        df: Pandas DataFrame
+            results for the records in the partition
+        start: int
+            position of the first record of the partition
+        num_records: int
+            total number of records. Needed the first time results are
+            stored, when the store is allocated
+
+        Returns
+        -------
+        None
+        """
+        if not self._blocks:
+            if num_records is None:
+                raise ValueError(
+                    "num_records is needed the first time results are stored"
+                )
+            self._allocate(list(df.columns), num_records, df)
+        if start < 0 or start + len(df.index) > self.num_records:
+            msg = (f"Records {start} to {start + len(df.index)} are outside "
+                   f"the {self.num_records} records in the store")
+            raise ValueError(msg)
+        self._write(year, scenario, df, start)
+
+    def frame(self, year: int, scenario: str) -> pd.DataFrame:
+        """
+        Return the results for a year and scenario
+
+        Parameters
+        ----------
+        year: int
+            year of results to return
+        scenario: str
+            scenario of results to return, 'base' or 'reform'
+
+        Returns
+        -------
+        Pandas DataFrame
+            DataFrame whose columns are read-only views on the store.
+            Changing its values in place raises a ValueError
+        """
+        if not self.has_year(year, scenario):
+            raise KeyError(year)
+        yr_idx = self._year_index(year)
+        sc_idx = self._scenario_index(scenario)
+        if len(self._blocks) == 1:
+            values = next(iter(self._blocks.values()))[:, yr_idx, :, sc_idx]
+            values.flags.writeable = False
+            return pd.DataFrame(values.T, columns=self.variables, copy=False)
+        columns = {
+            var: self.array(var)[yr_idx, :, sc_idx] for var in self.variables
+        }
+        return pd.DataFrame(columns, copy=False)
+
+    def array(self, var: str) -> np.ndarray:
+        """
+        Return the years x records x scenarios array for a variable
+
+        Parameters
+        ----------
+        var: str
+            name of the variable
+
+        Returns
+        -------
+        Numpy array
+            read-only view on the values of the variable in the store
+        """
+        dtype, pos = self._locations[var]
+        values = self._blocks[dtype][pos]
+        values.flags.writeable = False
+        return values
+
+    def weighted_sum(self, var: str, wt: str = "s006") -> np.ndarray:
+        """
+        Compute the weighted sum of a variable for all years and scenarios
+
+        Parameters
+        ----------
+        var: str
+            variable to sum
+        wt: str
+            name of the weight variable
+
+        Returns
+        -------
+        Numpy array
+            years x scenarios array of weighted sums
+        """
+        return self.weighted_sums([var], wt)[0]
+
+    def weighted_sums(self, variables: list, wt: str = "s006") -> np.ndarray:
+        """
+        Compute the weighted sums of several variables for all years and
+        scenarios. The sums of every variable in the store are computed in
+        a single pass over the data the first time a weight is used and are
+        reused until new results are stored.
+
+        Parameters
+        ----------
+        variables: list
+            variables to sum
+        wt: str
+            name of the weight variable
+
+        Returns
+        -------
+        Numpy array
+            variables x years x scenarios array of weighted sums
+        """
+        if wt not in self._sums:
+            weights = self.array(wt)
+            sums = np.zeros((len(self.variables), len(self.years),
+                             len(self.SCENARIOS)))
+            weights = weights.astype(np.float64, copy=False)
+            # one matrix-vector product per data type, year and scenario.
+            # Values stored in smaller types are promoted to double precision
+            for dtype, block in self._blocks.items():
+                idx = [self._var_index[var] for var in self._block_vars[dtype]]
+                for yr_idx in range(len(self.years)):
+                    for sc_idx in range(len(self.SCENARIOS)):
+                        sums[idx, yr_idx, sc_idx] = np.dot(
+                            block[:, yr_idx, :, sc_idx],
+                            weights[yr_idx, :, sc_idx]
+                        )
+            self._sums[wt] = sums
+        idx = [self._var_index[var] for var in variables]
+        return self._sums[wt][idx]
+
+    def clear_sums(self):
+        """
+        Discard the weighted sums kept for every weight. They are computed
+        again the next time they are used
+        """
+        self._sums.clear()
+
+    def clear(self, year: int, scenario: str):
+        """
+        Mark the results for a year and scenario as missing
+        """
+        if not self.has_year(year, scenario):
+            raise KeyError(year)
+        yr_idx = self._year_index(year)
+        sc_idx = self._scenario_index(scenario)
+        self._filled[yr_idx, sc_idx] = False
+        self._rows[yr_idx, sc_idx] = 0
+        self._versions[yr_idx, sc_idx] += 1
+        self.clear_sums()
+
+    # ----- private methods -----
+    def _write(self, year, scenario, df, start):
+        """
+        Write results into the store starting at a given record
+        """
+        missing = set(self.variables) - set(df.columns)
+        if missing:
+            msg = f"Results for {year} are missing variable(s) {missing}"
+            raise ValueError(msg)
+        yr_idx = self._year_index(year)
+        sc_idx = self._scenario_index(scenario)
+        rows = slice(start, start + len(df.index))
+        for dtype in [dtype for dtype in self._blocks
+                      if np.issubdtype(dtype, np.integer)]:
+            for var in list(self._block_vars[dtype]):
+                values = df[var].to_numpy()
+                info = np.iinfo(dtype)
+                if values.min() < info.min or values.max() > info.max:
+                    wider = np.promote_types(dtype,
+                                             _compact_dtype(var, values))
+                    self._move(var, wider)
+        for dtype, block in self._blocks.items():
+            variables = self._block_vars[dtype]
+            values = df[variables].to_numpy(dtype=dtype)
+            block[:, yr_idx, rows, sc_idx] = values.T
+        if rows.start == 0 and rows.stop == self.num_records:
+            self._rows[yr_idx, sc_idx] = self.num_records
+        else:
+            self._rows[yr_idx, sc_idx] += len(df.index)
+        self._filled[yr_idx, sc_idx] = (
+            self._rows[yr_idx, sc_idx] >= self.num_records
+        )
+        self._versions[yr_idx, sc_idx] += 1
+        self.clear_sums()
+
+    def _allocate(self, variables, num_records, df):
+        """
+        Create the arrays used to hold all of the results
+        """
+        self.variables = variables
+        self._var_index = {var: i for i, var in enumerate(variables)}
+        for var in variables:
+            dtype = np.dtype(np.float64)
+            if self.result_dtype == "compact":
+                dtype = _compact_dtype(var, df[var].to_numpy())
+            self._block_vars.setdefault(dtype, []).append(var)
+        for dtype, block_vars in self._block_vars.items():
+            for pos, var in enumerate(block_vars):
+                self._locations[var] = (dtype, pos)
+            self._blocks[dtype] = self._new_block(dtype, len(block_vars),
+                                                  num_records)
+
+    def _new_block(self, dtype, num_vars, num_records, suffix=""):
+        """
+        Create an array for the results of num_vars variables of one data
+        type, memory mapped if the store has a directory
+        """
+        shape = (num_vars, len(self.years), num_records, len(self.SCENARIOS))
+        if self.directory is None:
+            return np.zeros(shape, dtype=dtype)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return np.lib.format.open_memmap(
+            self.directory / f"{dtype.name}{suffix}.npy", mode="w+",
+            dtype=dtype, shape=shape
+        )
+
+    def _move(self, var, dtype):
+        """
+        Move an integer variable to the array for a wider data type. The
+        arrays it leaves and joins are reallocated and the stored values
+        copied over
+        """
+        old_dtype, _ = self._locations[var]
+        old_vars = self._block_vars.pop(old_dtype)
+        old_block = self._blocks.pop(old_dtype)
+        new_vars = self._block_vars.get(dtype, []) + [var]
+        num_records = old_block.shape[2]
+        new_block = self._new_block(dtype, len(new_vars), num_records, ".new")
+        if dtype in self._blocks:
+            new_block[:-1] = self._blocks[dtype]
+        new_block[-1] = old_block[old_vars.index(var)]
+        kept = [v for v in old_vars if v != var]
+        if kept:
+            kept_block = self._new_block(old_dtype, len(kept), num_records,
+                                         ".new")
+            kept_block[:] = old_block[[old_vars.index(v) for v in kept]]
+            self._set_block(old_dtype, kept, kept_block)
+        elif self.directory is not None:
+            (self.directory / f"{old_dtype.name}.npy").unlink()
+        del old_block
+        self._set_block(dtype, new_vars, new_block)
+
+    def _set_block(self, dtype, block_vars, block):
+        """
+        Replace the array for a data type with one that holds block_vars
+        """
+        if self.directory is not None:
+            # the memory map stays valid when its file is renamed
+            os.replace(self.directory / f"{dtype.name}.new.npy",
+                       self.directory / f"{dtype.name}.npy")
+        self._blocks[dtype] = block
+        self._block_vars[dtype] = block_vars
+        for pos, var in enumerate(block_vars):
+            self._locations[var] = (dtype, pos)
+
+    def _year_index(self, year):
+        try:
+            return self.years.index(year)
+        except ValueError:
+            raise KeyError(year)
+
+    def _scenario_index(self, scenario):
+        try:
+            return self.SCENARIOS.index(scenario)
+        except ValueError:
+            raise ValueError(f"scenario must be one of {self.SCENARIOS}")
+
+
+def _compact_dtype(var, values):
+    """
+    Find the smallest data type that can store a variable in compact results
+    """
+    if var in WEIGHT_VARIABLES:
+        return np.dtype(np.float64)
+    if var in INTEGER_VARIABLES:
+        for dtype in [np.int8, np.int16, np.int32]:
+            info = np.iinfo(dtype)
+            if values.min() >= info.min and values.max() <= info.max:
+                return np.dtype(dtype)
+        return np.dtype(np.int64)
+    return np.dtype(np.float32)
+
+
+class ScenarioData(MutableMapping):
+    """
+    Dictionary-like accessor that maps each year to a DataFrame with the
+    results of one scenario in a ResultsStore
+    """
+
+    def __init__(self, store: ResultsStore, scenario: str):
+        self.store = store
+        self.scenario = scenario
+
+    def __getitem__(self, year):
+        return self.store.frame(year, self.scenario)
+
+    def __setitem__(self, year, df):
+        self.store.set_frame(year, self.scenario, df)
+
+    def __delitem__(self, year):
+        self.store.clear(year, self.scenario)
+
+    def __iter__(self):
+        for year in self.store.years:
+            if self.store.has_year(year, self.scenario):
+                yield year
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"ScenarioData({self.scenario!r}, years={list(self)})"
@@ -0,0 +1,292 @@
+"""
+Stratified sampling of the micro-data and estimates of the sampling error
+of the totals computed from a sample
+"""
+import numpy as np
+import pandas as pd
+
+
+# input variables added up to place records in income strata
+SAMPLE_INCOME_VARS = [
+    "e00200", "e00300", "e00600", "e00900", "e01500", "e02000", "e02100",
+    "e02400", "p22250", "p23250"
+]
+
+
+class StratifiedSample:
+    """
+    Stratified random sample of the records in the micro-data. Records are
+    placed in strata by filing status and by income, using the sum of the
+    income variables in SAMPLE_INCOME_VARS found in the micro-data. Each
+    filing status is split into income groups with the same number of
+    records, and the records with the largest incomes in absolute value are
+    placed in their own stratum that is always included in full, since a
+    few of them account for a large share of tax revenue. The same fraction
+    of the records in every other stratum is drawn without replacement.
+
+    Samples drawn from the same micro-data with the same random_state are
+    nested: every record in a smaller sample is also in a larger one.
+
+    The sample weights of each record are scaled so that the weights in
+    each stratum add up to the weights of all of the records in that
+    stratum. Weighted totals are then ratio estimators within each stratum,
+    and their standard errors are estimated by linearization with the
+    variance estimator for a stratified sample drawn without replacement.
+    """
+
+    def __init__(self, strata: np.ndarray, positions: np.ndarray):
+        """
+        Constructor for the StratifiedSample class
+
+        Parameters
+        ----------
+        strata: Numpy array
+            stratum of each record in the micro-data, numbered from zero
+        positions: Numpy array
+            positions in the micro-data of the records in the sample
+
+        Returns
+        -------
+        None
+        """
+        self.strata = np.asarray(strata)
+        self.positions = np.sort(np.asarray(positions))
+        self.num_strata = int(self.strata.max()) + 1
+        self.sample_strata = self.strata[self.positions]
+        self.population_sizes = np.bincount(self.strata,
+                                            minlength=self.num_strata)
+        self.sample_sizes = np.bincount(self.sample_strata,
+                                        minlength=self.num_strata)
+
+    @classmethod
+    def draw(cls, microdata: pd.DataFrame, frac: float,
+             random_state: int = None, num_income_groups: int = 10,
+             top_share: float = 0.001):
+        """
+        Draw a stratified sample of the records in the micro-data
+
+        Parameters
+        ----------
+        microdata: Pandas DataFrame
+            micro-data to sample from
+        frac: float
+            fraction of the records to draw from each stratum
+        random_state: int
+            seed for the random number generator
+        num_income_groups: int
+            number of income groups each filing status is split into
+        top_share: float
+            share of the records, those with the largest incomes, that are
+            always included in the sample
+
+        Returns
+        -------
+        StratifiedSample
+        """
+        if not 0 < frac <= 1:
+            raise ValueError("frac must be greater than 0 and at most 1")
+        num_records = len(microdata.index)
+        income = np.zeros(num_records)
+        for var in SAMPLE_INCOME_VARS:
+            if var in microdata.columns:
+                income += microdata[var].to_numpy(dtype=np.float64)
+        if "MARS" in microdata.columns:
+            _, mars = np.unique(microdata["MARS"].to_numpy(),
+                                return_inverse=True)
+        else:
+            mars = np.zeros(num_records, dtype=np.int64)
+        # income group of each record within its filing status
+        groups = np.empty(num_records, dtype=np.int64)
+        for status in np.unique(mars):
+            idx = np.flatnonzero(mars == status)
+            order = idx[np.argsort(income[idx], kind="stable")]
+            groups[order] = (np.arange(len(order)) * num_income_groups //
+                             len(order))
+        strata = mars * num_income_groups + groups
+        num_top = int(np.ceil(top_share * num_records))
+        top = np.argsort(-np.abs(income), kind="stable")[:num_top]
+        strata[top] = strata.max() + 1
+        # number the strata that have records consecutively
+        _, strata = np.unique(strata, return_inverse=True)
+        top_stratum = strata[top[0]] if num_top else -1
+
+        rng = np.random.default_rng(random_state)
+        order = np.argsort(strata, kind="stable")
+        bounds = np.cumsum(np.bincount(strata))[:-1]
+        positions = []
+        for stratum, members in enumerate(np.split(order, bounds)):
+            if stratum == top_stratum:
+                size = len(members)
+            else:
+                # at least two records are needed to estimate the variance
+                size = max(int(round(frac * len(members))),
+                           min(2, len(members)))
+            # the records are shuffled before the sample is taken from the
+            # front, so samples drawn with the same seed are nested
+            positions.append(rng.permutation(members)[:size])
+        return cls(strata, np.concatenate(positions))
+
+    def weight_factors(self, weights: pd.DataFrame) -> np.ndarray:
+        """
+        Find the factors that scale the weights of the sampled records so
+        that the weights in each stratum add up to the weights of all of the
+        records in that stratum
+
+        Parameters
+        ----------
+        weights: Pandas DataFrame
+            weights of every record in the micro-data, one column per year
+
+        Returns
+        -------
+        Numpy array
+            sampled records x years array of factors
+        """
+        values = weights.to_numpy(dtype=np.float64)
+        population = np.zeros((self.num_strata, values.shape[1]))
+        np.add.at(population, self.strata, values)
+        sample = np.zeros((self.num_strata, values.shape[1]))
+        np.add.at(sample, self.sample_strata, values[self.positions])
+        factors = np.divide(population, sample, out=np.ones_like(sample),
+                            where=sample > 0)
+        return factors[self.sample_strata]
+
+    def residuals(self, values: np.ndarray,
+                  weights: np.ndarray) -> np.ndarray:
+        """
+        Find the residual of each sampled record used to estimate the
+        variance of a weighted total. Because the weights in each stratum
+        are scaled to a known total, the total is a ratio estimator and the
+        residuals are the weighted values less the weight times the mean of
+        the stratum. Residuals of several totals computed from the same
+        sample, such as the totals for each year, can be added to get the
+        residuals of the sum of the totals
+
+        Parameters
+        ----------
+        values: Numpy array
+            weighted value of each sampled record
+        weights: Numpy array
+            weight of each sampled record
+
+        Returns
+        -------
+        Numpy array
+            residual of each sampled record
+        """
+        totals = np.bincount(self.sample_strata, weights=values,
+                             minlength=self.num_strata)
+        weight_totals = np.bincount(self.sample_strata, weights=weights,
+                                    minlength=self.num_strata)
+        ratios = np.divide(totals, weight_totals, out=np.zeros_like(totals),
+                           where=weight_totals != 0)
+        return values - weights * ratios[self.sample_strata]
+
+    def standard_error(self, residuals: np.ndarray) -> float:
+        """
+        Estimate the standard error of a weighted total
+
+        Parameters
+        ----------
+        residuals: Numpy array
+            residual of each sampled record, as returned by residuals()
+
+        Returns
+        -------
+        float
+            standard error of the total
+        """
+        sums = np.bincount(self.sample_strata, weights=residuals,
+                           minlength=self.num_strata)
+        squares = np.bincount(self.sample_strata,
+                              weights=residuals * residuals,
+                              minlength=self.num_strata)
+        n = self.sample_sizes.astype(np.float64)
+        within = squares - np.divide(sums * sums, n, out=np.zeros_like(n),
+                                     where=n > 0)
+        return float(np.sqrt(np.maximum(within, 0.) @ self._scale()))
+
+    def moments(self, values: np.ndarray, weights: np.ndarray,
+                labels: np.ndarray = None, num_groups: int = 1) -> np.ndarray:
+        """
+        Sum the values of the sampled records, the values times the
+        weights, and the squared values in each group and stratum. These
+        sums can be added across groups and passed to variance() to
+        estimate the variance of the total of any combination of groups
+
+        Parameters
+        ----------
+        values: Numpy array
+            weighted value of each sampled record
+        weights: Numpy array
+            weight of each sampled record
+        labels: Numpy array
+            group of each sampled record. Records labeled -1 are left out
+            of every group. If None, all records are in one group
+        num_groups: int
+            number of groups
+
+        Returns
+        -------
+        Numpy array
+            3 x groups x strata array of the sums of the values, the values
+            times the weights, and the squared values
+        """
+        strata = self.sample_strata
+        if labels is None:
+            labels = np.zeros(len(values), dtype=np.int64)
+        valid = labels >= 0
+        if not valid.all():
+            labels = labels[valid]
+            values = values[valid]
+            weights = weights[valid]
+            strata = strata[valid]
+        cells = labels * self.num_strata + strata
+        size = num_groups * self.num_strata
+        sums = [
+            np.bincount(cells, weights=values, minlength=size),
+            np.bincount(cells, weights=values * weights, minlength=size),
+            np.bincount(cells, weights=values * values, minlength=size)
+        ]
+        return np.stack(sums).reshape(3, num_groups, self.num_strata)
+
+    def variance(self, moments: np.ndarray,
+                 weights: np.ndarray) -> np.ndarray:
+        """
+        Estimate the variance of the weighted totals of groups from the sums
+        returned by moments()
+
+        Parameters
+        ----------
+        moments: Numpy array
+            3 x groups x strata array returned by moments()
+        weights: Numpy array
+            weight of each sampled record, including those in no group
+
+        Returns
+        -------
+        Numpy array
+            variance of the total of each group
+        """
+        sums, cross, squares = moments
+        weight_totals = np.bincount(self.sample_strata, weights=weights,
+                                    minlength=self.num_strata)
+        weight_squares = np.bincount(self.sample_strata,
+                                     weights=weights * weights,
+                                     minlength=self.num_strata)
+        ratios = np.divide(sums, weight_totals, out=np.zeros_like(sums),
+                           where=weight_totals != 0)
+        # sum of the squared residuals of the records in each stratum
+        within = squares - 2 * ratios * cross + ratios ** 2 * weight_squares
+        return np.maximum(within, 0.) @ self._scale()
+
+    def _scale(self):
+        """
+        Finite population correction times n / (n - 1) for each stratum.
+        Strata included in full or with a single record do not add to the
+        variance
+        """
+        n = self.sample_sizes.astype(np.float64)
+        big_n = self.population_sizes.astype(np.float64)
+        return np.divide((1 - n / big_n) * n, n - 1, out=np.zeros_like(n),
+                         where=n > 1)
@@ -1,11 +1,23 @@
+import os
+import copy
+from pathlib import Path
 import taxcalc as tc
+import numpy as np
 import pandas as pd
 import behresp
-from taxcalc.utils import (DIST_VARIABLES, DIFF_VARIABLES,
-                           create_distribution_table, create_difference_table)
+from taxcalc.utils import DIST_VARIABLES, DIFF_VARIABLES
 from dask import compute, delayed
-from collections import defaultdict
-from taxbrain.utils import weighted_sum, update_policy
+from taxbrain.utils import update_policy
+from taxbrain.results import ResultsStore, ScenarioData
+from taxbrain.groups import (IncomeGroups, grouped_distribution_table,
+                             grouped_difference_table,
+                             grouped_distribution_se, grouped_difference_se)
+from taxbrain.hooks import Hooks
+from taxbrain.sampling import StratifiedSample
+from taxbrain.microdata import (read_microdata, microdata_positions,
+                                microdata_chunks, read_partition)
+from taxbrain.cache import (BASELINE_CACHE, DEFAULTS_CACHE, Checkpoint,
+                            hash_inputs, hash_microdata)
 from typing import Union
 
 
@@ -15,6 +27,8 @@ class TaxBrain:
     LAST_BUDGET_YEAR = tc.Policy.LAST_BUDGET_YEAR
     # Default list of variables saved for each year
     DEFAULT_VARIABLES = list(set(DIST_VARIABLES).union(set(DIFF_VARIABLES)))
+    # Default fractions of the records used in each stage of run_progressive
+    PROGRESSIVE_STAGES = [0.01, 0.05, 0.25, 1.0]
 
     # add dictionary to hold version of the various models
     VERSIONS = {
@@ -26,7 +40,9 @@ class TaxBrain:
                  microdata: Union[str, dict] = None, use_cps: bool = False,
                  reform: Union[str, dict] = None, behavior: dict = None,
                  assump=None, base_policy: Union[str, dict] = None,
-                 verbose=False):
+                 verbose=False, result_dtype: str = "float64",
+                 hooks: list = None, sample: float = None,
+                 sample_seed: int = 0):
         """
         Constructor for the TaxBrain class
 
@@ -40,7 +56,9 @@ class TaxBrain:
             year allowed in Tax-Calculator.
         microdata: str or Pandas DataFrame
             Either a path to a micro-data file or a Pandas DataFrame
-            containing micro-data.
+            containing micro-data. Parquet and Arrow IPC files and
+            directories of .npy column files, as written by
+            `convert_microdata()`, are memory mapped rather than parsed.
         use_cps: bool
             A boolean value to indicate whether or not the analysis should
             be run using the CPS file included in Tax-Calculator.
@@ -66,6 +84,29 @@ class TaxBrain:
         verbose: bool
             A boolean value indicated whether or not to write model
             progress reports.
+        result_dtype: str
+            How the results of each year are stored. 'float64' keeps every
+            variable in double precision. 'compact' stores monetary
+            variables in single precision and categorical and count
+            variables, such as MARS and XTOT, as small integers, which
+            roughly halves the memory used by the results. Weighted totals
+            and tables are still accumulated in double precision.
+        hooks: list
+            Functions called with an event at the start and end of each
+            phase of a run, such as building the Records object or running
+            calc_all for a year. More can be added later with
+            `TaxBrain.hooks.add()`. See the Hooks class for the contents of
+            each event.
+        sample: float
+            If given, the calculators are run on a sample of this fraction
+            of the records, stratified by filing status and income. The
+            weights of the sampled records are scaled up to the totals of
+            their strata, and the approximate standard errors of the totals
+            and tables are available from `weighted_totals_se()`,
+            `distribution_table_se()` and `differences_table_se()`. See the
+            StratifiedSample class for how the sample is drawn.
+        sample_seed: int
+            seed used to draw the sample
 
         Returns
         -------
@@ -88,13 +129,22 @@ class TaxBrain:
             f"Specified end_year, {end_year}, comes after last known "
             f"budget year, {TaxBrain.LAST_BUDGET_YEAR}."
         )
+        if sample is not None and not 0 < sample <= 1:
+            raise ValueError("sample must be greater than 0 and at most 1")
         self.microdata = microdata
+        self.result_dtype = result_dtype
+        self.sample_frac = sample
+        self.sample_seed = sample_seed
+        # StratifiedSample the results were computed from, if any
+        self.sample = None
         self.use_cps = use_cps
         self.start_year = start_year
         self.end_year = end_year
-        self.base_data = {yr: {} for yr in range(start_year, end_year + 1)}
-        self.reform_data = {yr: {} for yr in range(start_year, end_year + 1)}
+        self._reset_results()
         self.verbose = verbose
+        self.hooks = Hooks()
+        for hook in hooks or []:
+            self.hooks.add(hook)
 
         # Process user inputs early to throw any errors quickly
         self.params = self._process_user_mods(reform, assump)
@@ -107,7 +157,11 @@ class TaxBrain:
 
         self.has_run = False
 
-    def run(self, varlist: list = DEFAULT_VARIABLES):
+    def run(self, varlist: list = DEFAULT_VARIABLES, client=None,
+            num_workers: int = None, use_cache: bool = False,
+            cache_dir: str = None, checkpoint_dir: str = None,
+            chunk_size: int = None, num_shards: int = 1,
+            results_dir: str = None):
         """
         Run the calculators. TaxBrain will determine whether to do a static or
         partial equilibrium run based on the user's inputs when initializing
@@ -117,27 +171,638 @@ class TaxBrain:
         ----------
         varlist: list
             variables from the microdata to be stored in each year
+        client: Dask Client object
+            Dask client used to schedule the calculations. If None, a local
+            scheduler is used
+        num_workers: int
+            number of worker processes to use when no client is given. If
+            greater than one, the years in the analysis are split across the
+            workers. In a static run, the baseline and reform calculators
+            are also run in separate processes at the same time. Defaults
+            to num_shards
+        use_cache: bool
+            whether to reuse baseline results from a previous static run with
+            the same micro-data, baseline policy, baseline growth assumptions,
+            years, and variables
+        cache_dir: str
+            directory where cached baseline results are written so they can
+            be used by other processes. Setting this turns on use_cache
+        checkpoint_dir: str
+            directory where the results for each year are saved as soon as
+            they are finished. If the directory holds results from an
+            earlier run with the same inputs, those years are loaded instead
+            of being run again
+        chunk_size: int
+            if given, the records are split into partitions of at most this
+            many records and the calculators are run on one partition at a
+            time. The results of each partition are written straight into
+            the results store, so memory use does not grow with the number
+            of partitions. Together with results_dir, micro-data much larger
+            than memory can be used. Cannot be combined with caching or
+            checkpointing
+        num_shards: int
+            if greater than one, the records are split into this many
+            partitions that are run at the same time by the workers, and
+            the results of the partitions are combined in order. Each worker
+            reads its own partition of the micro-data, memory mapping it if
+            possible, and creates its own calculators. Unlike splitting the
+            years across the workers, this also speeds up single year runs.
+            Cannot be combined with chunk_size, caching or checkpointing
+        results_dir: str
+            if given, the results are kept in memory mapped files in this
+            directory rather than in memory
 
         Returns
         -------
         None
         """
-        base_calc, reform_calc = self._make_calculators()
         if not isinstance(varlist, list):
             msg = f"'varlist' is of type {type(varlist)}. Must be a list."
             raise TypeError(msg)
+        if "s006" not in varlist:  # ensure weight is always included
+            varlist.append("s006")
+        if num_workers is None:
+            num_workers = num_shards
+        if cache_dir and checkpoint_dir and (
+            Path(cache_dir).resolve() == Path(checkpoint_dir).resolve()
+        ):
+            raise ValueError("cache_dir and checkpoint_dir must differ")
+        if chunk_size or num_shards > 1:
+            if chunk_size and num_shards > 1:
+                raise ValueError(
+                    "chunk_size and num_shards cannot be used together"
+                )
+            if use_cache or cache_dir or checkpoint_dir:
+                raise ValueError(
+                    "chunk_size and num_shards cannot be used with "
+                    "use_cache, cache_dir, or checkpoint_dir"
+                )
+            self._reset_results(results_dir)
+            if chunk_size:
+                if self.verbose:
+                    print(f"Running simulations in chunks of {chunk_size} "
+                          "records")
+                self._chunked_run(varlist, chunk_size)
+            else:
+                if self.verbose:
+                    print(f"Running simulations in {num_shards} shards")
+                self._sharded_run(varlist, num_shards, client, num_workers)
+            setattr(self, "has_run", True)
+            return
+        self._reset_results(results_dir)
+        checkpoint = None
+        if checkpoint_dir:
+            checkpoint = Checkpoint(checkpoint_dir, self._run_key(varlist))
+            saved = checkpoint.open()
+            for (year, scenario), df in saved.items():
+                if year in self.results.years:
+                    self.results.set_frame(year, scenario, df)
+            if self.verbose and saved:
+                print(f"Loaded {len(saved)} results from {checkpoint_dir}")
         if self.params["behavior"]:
             if self.verbose:
                 print("Running dynamic simulations")
-            self._dynamic_run(varlist, base_calc, reform_calc)
+            base_calc, reform_calc = self._make_calculators()
+            self._dynamic_run(varlist, base_calc, reform_calc, client,
+                              num_workers, checkpoint)
+            del base_calc, reform_calc
         else:
             if self.verbose:
                 print("Running static simulations")
-            self._static_run(varlist, base_calc, reform_calc)
+            self._static_run(varlist, client, num_workers,
+                             use_cache or bool(cache_dir), cache_dir,
+                             checkpoint)
         setattr(self, "has_run", True)
 
+    def iter_run(self, varlist: list = DEFAULT_VARIABLES,
+                 retain: bool = True):
+        """
+        Run the calculators one year at a time, yielding the results for each
+        year as soon as they are available. Like run(), TaxBrain will
+        determine whether to do a static or partial equilibrium run based on
+        the user's inputs.
+
+        Parameters
+        ----------
+        varlist: list
+            variables from the microdata to be returned for each year
+        retain: bool
+            whether to also store the results in base_data and reform_data.
+            If False, nothing is kept on the TaxBrain object and memory use
+            does not grow with the number of years
+
+        Yields
+        ------
+        year: int
+            year of the results
+        base: Pandas DataFrame
+            results for the baseline calculator
+        reform: Pandas DataFrame
+            results for the reform calculator
+        """
+        if not isinstance(varlist, list):
+            msg = f"'varlist' is of type {type(varlist)}. Must be a list."
+            raise TypeError(msg)
+        if "s006" not in varlist:  # ensure weight is always included
+            varlist.append("s006")
+        self._reset_results()
+        base_calc, reform_calc = self._make_calculators()
+        setattr(self, "has_run", False)
+        reform_years = self._reform_years()
+        for year in range(self.start_year, self.end_year + 1):
+            base, reform = _run_year(base_calc, reform_calc, year, varlist,
+                                     self.params["behavior"],
+                                     year in reform_years, self.hooks)
+            if retain:
+                self.base_data[year] = base
+                self.reform_data[year] = reform
+                # hand out the stored views rather than keeping two copies
+                base = self.base_data[year]
+                reform = self.reform_data[year]
+            yield year, base, reform
+            del base, reform
+        if retain:
+            setattr(self, "has_run", True)
+
         del base_calc, reform_calc
 
+    def run_progressive(self, stages: list = PROGRESSIVE_STAGES,
+                        varlist: list = DEFAULT_VARIABLES,
+                        variables: list = None, rtol: float = None):
+        """
+        Run the calculators on a series of growing stratified samples of the
+        records, ending with all of them if the last stage is 1. Results for
+        a small sample are available quickly and are refined by each stage.
+        The samples are nested, so only the records added in each stage are
+        run and the results of the earlier stages are reused. After each
+        stage the TaxBrain object holds the results for that stage's sample,
+        so weighted_totals(), the tables, and their standard errors can be
+        used before the next stage is run.
+
+        Parameters
+        ----------
+        stages: list
+            fractions of the records used in each stage, in ascending order
+        varlist: list
+            variables from the microdata to be stored in each year
+        variables: list
+            variables whose weighted totals are reported in the convergence
+            diagnostics. Defaults to 'iitax', 'payrolltax', and 'combined'
+        rtol: float
+            if given, no more stages are run once the standard error of the
+            difference between the reform and baseline totals over all
+            years is less than rtol times its absolute value for every
+            variable in variables
+
+        Yields
+        ------
+        frac: float
+            fraction of the records used in the stage
+        diagnostics: Pandas DataFrame
+            one row for each variable in variables with the total difference
+            between the reform and baseline over all years, its standard
+            error, the standard error relative to the absolute difference,
+            the number of records run, and the change in the difference
+            since the last stage
+        """
+        if not isinstance(varlist, list):
+            msg = f"'varlist' is of type {type(varlist)}. Must be a list."
+            raise TypeError(msg)
+        if "s006" not in varlist:  # ensure weight is always included
+            varlist.append("s006")
+        if not stages or any(not 0 < frac <= 1 for frac in stages):
+            raise ValueError(
+                "stages must be fractions greater than 0 and at most 1"
+            )
+        if any(np.diff(stages) <= 0):
+            raise ValueError("stages must be in ascending order")
+        if variables is None:
+            variables = ["iitax", "payrolltax", "combined"]
+        microdata, positions, weights, factors = self._records_inputs()
+        if not isinstance(microdata, pd.DataFrame):
+            microdata = pd.read_csv(microdata)
+        weights = weights.iloc[positions]
+        del positions
+        # the weights column used for s006 in each year
+        wt_years = np.array([int(col[2:]) for col in weights.columns])
+        wt_cols = {
+            year: max(np.searchsorted(wt_years, year, side="right") - 1, 0)
+            for year in range(self.start_year, self.end_year + 1)
+        }
+        years = list(range(self.start_year, self.end_year + 1))
+        reform_years = self._reform_years()
+        done = np.empty(0, dtype=np.int64)
+        # results of every record run so far, in the order they were run
+        frames = {year: [None, None] for year in years}
+        last_difference = None
+        self._reset_results()
+        setattr(self, "has_run", False)
+        for stage, frac in enumerate(stages):
+            sample = StratifiedSample.draw(microdata, frac, self.sample_seed)
+            new = np.setdiff1d(sample.positions, done)
+            if len(new):
+                records = self._weighted_records(microdata.iloc[new],
+                                                 weights.iloc[new],
+                                                 stage=stage)
+                base_calc, reform_calc = self._make_calculators(records)
+                del records
+                output = _run_years(base_calc, reform_calc, years, varlist,
+                                    self.params["behavior"], reform_years,
+                                    hooks=self.hooks)
+                del base_calc, reform_calc
+                for year, results in output.items():
+                    for i, df in enumerate(results):
+                        frames[year][i] = pd.concat(
+                            [frames[year][i], df], ignore_index=True
+                        )
+                del output, results
+                done = np.concatenate([done, new])
+            # results are combined in the order of the sampled records
+            order = np.argsort(done, kind="stable")
+            in_sample = np.isin(done[order], sample.positions)
+            rows = order[in_sample]
+            s006 = weights.values[sample.positions].astype(np.float64)
+            s006 *= sample.weight_factors(weights)
+            if factors is not None:
+                s006 *= factors
+            s006 *= 0.01
+            self._reset_results()
+            for year in years:
+                for scenario, year_frame in zip(["base", "reform"],
+                                                frames[year]):
+                    df = year_frame.iloc[rows].reset_index(drop=True)
+                    df["s006"] = s006[:, wt_cols[year]]
+                    self.results.set_frame(year, scenario, df)
+                    del df
+            # all of the records are used in a stage with frac 1
+            self.sample = sample if frac < 1 else None
+            diagnostics = pd.DataFrame(
+                index=variables,
+                columns=["difference", "standard_error", "relative_error",
+                         "num_records", "change"],
+                dtype=np.float64
+            )
+            for var in variables:
+                diff = self.weighted_totals(
+                    var, include_total=True
+                ).loc["Difference", "Total"]
+                se = self.weighted_totals_se(
+                    var, include_total=True
+                ).loc["Difference", "Total"]
+                diagnostics.loc[var, "difference"] = diff
+                diagnostics.loc[var, "standard_error"] = se
+            diagnostics["num_records"] = len(sample.positions)
+            se = diagnostics["standard_error"].values
+            diff = np.abs(diagnostics["difference"].values)
+            diagnostics["relative_error"] = np.where(
+                se == 0, 0., np.divide(se, diff, out=np.full_like(se, np.inf),
+                                       where=diff > 0)
+            )
+            if last_difference is not None:
+                diagnostics["change"] = (diagnostics["difference"] -
+                                         last_difference)
+            last_difference = diagnostics["difference"].copy()
+            if self.verbose:
+                print(f"Stage {stage}: {len(sample.positions)} records "
+                      f"({len(new)} new)")
+            setattr(self, "has_run", True)
+            yield frac, diagnostics
+            if rtol is not None and (
+                diagnostics["relative_error"] < rtol
+            ).all():
+                break
+
+    def run_many(self, reforms: list, varlist: list = DEFAULT_VARIABLES,
+                 client=None, num_workers: int = 1) -> list:
+        """
+        Run several reforms against the baseline of this TaxBrain object.
+        The micro-data are read once, the baseline calculator is only run
+        once, and the reform calculators are spread across the workers.
+        Only static runs are supported.
+
+        Parameters
+        ----------
+        reforms: list
+            individual income tax policy reforms. Each can be any of the
+            formats accepted by the reform argument of the TaxBrain class
+        varlist: list
+            variables from the microdata to be stored in each year
+        client: Dask Client object
+            Dask client used to schedule the calculations. If None, a local
+            scheduler is used
+        num_workers: int
+            number of worker processes to use when no client is given
+
+        Returns
+        -------
+        tbs: list
+            a TaxBrain object with the results for each reform, in the
+            same order as reforms
+        """
+        # process every reform before running anything to throw any
+        # errors quickly
+        tbs = [self._child(reform) for reform in reforms]
+        calcs = [
+            (tb.params["growdiff_response"],
+             [tb.params["base_policy"], tb.params["policy"]],
+             tb._reform_years())
+            for tb in tbs
+        ]
+        if self.verbose:
+            print(f"Running {len(tbs)} static simulations")
+        self._run_reforms(tbs, calcs, varlist, client, num_workers)
+        return tbs
+
+    def sweep(self, param: str, values: list, years: list = None,
+              variables: list = None, groupby: str = "weighted_deciles",
+              varlist: list = DEFAULT_VARIABLES, client=None,
+              num_workers: int = 1) -> pd.DataFrame:
+        """
+        Score a grid of values for one policy parameter on top of the reform
+        of this TaxBrain object. The baseline calculator is only run once
+        and one reform calculator for each value is spread across the
+        workers. Only static runs are supported.
+
+        Parameters
+        ----------
+        param: str
+            name of the Tax-Calculator policy parameter
+        values: list
+            values of the parameter to score. Values of parameters that
+            vary by filing status or other dimensions are lists
+        years: list
+            years in which the parameter is set to each value. Like any
+            reform, the value carries over to later years. Defaults to the
+            first year of the analysis
+        variables: list
+            variables whose change in weighted totals is reported. Defaults
+            to 'iitax', 'payrolltax', and 'combined'
+        groupby: str
+            income groups used to report the percent change in after-tax
+            income, as in differences_table(). If None, the distribution of
+            the change is not reported
+        varlist: list
+            variables from the microdata to be stored in each year
+        client: Dask Client object
+            Dask client used to schedule the calculations. If None, a local
+            scheduler is used
+        num_workers: int
+            number of worker processes to use when no client is given
+
+        Returns
+        -------
+        Pandas DataFrame
+            one row for each value and year of the analysis, indexed by
+            value and year, with the change in the weighted total of each
+            variable in variables and, if groupby is given, the percent
+            change in after-tax income of each income group in columns
+            named 'pc_aftertaxinc_' followed by the group
+        """
+        if param not in DEFAULTS_CACHE.policy_metadata():
+            raise ValueError(f"{param} is not a policy parameter")
+        if years is None:
+            years = [self.start_year]
+        if variables is None:
+            variables = ["iitax", "payrolltax", "combined"]
+        reform_years = self._param_reform_years(years)
+        calcs = [
+            (self.params["growdiff_response"],
+             [self.params["base_policy"], self.params["policy"],
+              {param: {yr: value for yr in years}}],
+             reform_years)
+            for value in values
+        ]
+        tbs = [self._child(self.params["policy"]) for _ in values]
+        if self.verbose:
+            print(f"Running {len(tbs)} values of {param}")
+        self._run_reforms(tbs, calcs, varlist, client, num_workers)
+        frames = []
+        for value, tb in zip(values, tbs):
+            table = pd.DataFrame(
+                {var: tb.weighted_totals(var).loc["Difference"]
+                 for var in variables}
+            )
+            if groupby:
+                dist = pd.DataFrame({
+                    year: tb.differences_table(
+                        year, groupby, "combined"
+                    )["pc_aftertaxinc"]
+                    for year in tb.results.years
+                }).T
+                dist.columns = [f"pc_aftertaxinc_{col}"
+                                for col in dist.columns]
+                table = table.join(dist)
+            if isinstance(value, list):
+                value = tuple(value)
+            table.index = pd.MultiIndex.from_product(
+                [[value], table.index], names=[param, "year"]
+            )
+            frames.append(table)
+        del tbs
+        return pd.concat(frames)
+
+    def solve(self, param: str, bounds: tuple, target: float = 0.,
+              years: list = None, var: str = "combined",
+              sample: float = 0.05, rtol: float = 1e-4, max_iter: int = 20,
+              client=None, num_workers: int = 1):
+        """
+        Find the value of a policy parameter for which the change in the
+        weighted total of a variable over all years of the analysis, with
+        the reform of this TaxBrain object and the parameter applied, hits
+        a target. For example, the value that makes a reform revenue
+        neutral over the budget window. The root is kept bracketed and
+        found with the Illinois variant of the regula falsi method, which
+        converges about as fast as the secant method.
+
+        The value is first found with a stratified sample of the records
+        and then confirmed with all of them, or with the sample of this
+        TaxBrain object if one is used, starting from a bracket around the
+        value found with the sample. In each stage the records are only
+        built once and the baseline calculator is only run once. Only
+        static runs are supported.
+
+        Only scalar parameters, which take a single value in each year, can
+        be solved for. Parameters indexed by filing status (MARS), number
+        of EITC children (EIC), or deduction type (idedtype), such as STD,
+        are not supported.
+
+        Parameters
+        ----------
+        param: str
+            name of the Tax-Calculator policy parameter. It must be a
+            scalar parameter
+        bounds: tuple
+            lowest and highest value of the parameter. The change in the
+            total less the target must have opposite signs at the two
+            bounds
+        target: float
+            change in the total over all years to hit, 0 for revenue
+            neutrality
+        years: list
+            years in which the parameter is set to the value. Like any
+            reform, the value carries over to later years. Defaults to the
+            first year of the analysis
+        var: str
+            variable whose weighted total is changed, as in
+            weighted_totals()
+        sample: float
+            fraction of the records used to find the first estimate of the
+            value. If None, only the records of this TaxBrain object are
+            used
+        rtol: float
+            the search stops once the change in the total is within rtol
+            times the absolute baseline total over all years of the target
+        max_iter: int
+            largest number of values of the parameter tried in each stage.
+            If the target is not hit within rtol after max_iter values with
+            the final records, a ValueError is raised. The stage with the
+            sample only gives a starting point, so it may stop short of
+            the target
+        client: Dask Client object
+            Dask client used to schedule the calculations. If None, a local
+            scheduler is used
+        num_workers: int
+            number of worker processes to use when no client is given. The
+            years of each run are split across the workers
+
+        Returns
+        -------
+        value: float
+            value of the parameter found with the final records
+        history: Pandas DataFrame
+            every value tried, with the fraction of the records used, or
+            None for all of them, and the change in the total over all
+            years
+        """
+        if self.params["behavior"]:
+            raise ValueError("Only static runs are supported")
+        metadata = DEFAULTS_CACHE.policy_metadata()
+        if param not in metadata:
+            raise ValueError(f"{param} is not a policy parameter")
+        labels = _param_labels(metadata[param])
+        if labels:
+            raise ValueError(
+                f"{param} is indexed by {', '.join(labels)}. Only scalar "
+                "parameters can be solved for"
+            )
+        lower, upper = sorted(bounds)
+        if years is None:
+            years = [self.start_year]
+        all_years = list(range(self.start_year, self.end_year + 1))
+        reform_years = self._param_reform_years(years)
+        stages = [self.sample_frac]
+        if sample is not None and (self.sample_frac is None or
+                                   sample < self.sample_frac):
+            stages.insert(0, sample)
+        history = []
+
+        def totals(df):
+            return (df[var] * df["s006"]).sum()
+
+        value = slope = None
+        for stage, frac in enumerate(stages):
+            tb = self._child(self.params["policy"])
+            tb.sample_frac = frac
+            records = tb._make_records()
+            base_totals = {}
+            errors_at = {}
+
+            def evaluate(values):
+                """
+                Find the change in the total less the target for each value
+                """
+                calcs = {}
+                if not base_totals:
+                    calcs["base"] = (
+                        tb._make_calculator(
+                            records, self.params["growdiff_baseline"],
+                            [self.params["base_policy"]], "base"
+                        ),
+                        all_years
+                    )
+                for i, point in enumerate(values):
+                    policy_mods = [self.params["base_policy"],
+                                   self.params["policy"],
+                                   {param: {yr: point for yr in years}}]
+                    calc = tb._make_calculator(
+                        records, self.params["growdiff_response"],
+                        policy_mods, "reform"
+                    )
+                    calcs[i] = (calc, reform_years)
+                results = _run_calculators(calcs, [var, "s006"], client,
+                                           num_workers, hooks=self.hooks)
+                for year, df in results.pop("base", {}).items():
+                    base_totals[year] = totals(df)
+                errors = []
+                for i, point in enumerate(values):
+                    change = sum(totals(df) - base_totals[year]
+                                 for year, df in results[i].items())
+                    history.append((frac, point, change))
+                    if self.verbose:
+                        print(f"{param} = {point}: change of {change:,.0f}")
+                    errors.append(change - target)
+                    errors_at[point] = errors[-1]
+                return errors
+
+            if value is None:
+                # start from the bounds
+                points = [lower, upper]
+                errors = evaluate(points)
+                tol = rtol * abs(sum(base_totals.values()))
+            else:
+                # take a secant step from the value found with the sample
+                # of the last stage, using the slope found in that stage
+                points = [value]
+                errors = evaluate(points)
+                tol = rtol * abs(sum(base_totals.values()))
+                if abs(errors[0]) > tol:
+                    x = value
+                    if slope:
+                        x = min(max(value - errors[0] / slope, lower), upper)
+                    if x == value:
+                        x = lower if value == upper else upper
+                    points.append(x)
+                    errors += evaluate([x])
+            pairs = sorted(zip(points, errors))
+            value, error = min(pairs, key=lambda pair: abs(pair[1]))
+            if abs(error) <= tol:
+                continue
+            (a, fa), (b, fb) = pairs
+            # widen the bracket until the errors at its ends have opposite
+            # signs
+            while fa * fb > 0:
+                if (a, b) == (lower, upper):
+                    raise ValueError(
+                        f"The target is not reached for any value of {param} "
+                        f"between {lower} and {upper}"
+                    )
+                step = 2 * (b - a)
+                # move towards the end with the smaller error, unless it is
+                # already at a bound
+                if b == upper or (a > lower and abs(fa) < abs(fb)):
+                    b, fb = a, fa
+                    a = max(a - step, lower)
+                    fa, = evaluate([a])
+                else:
+                    a, fa = b, fb
+                    b = min(b + step, upper)
+                    fb, = evaluate([b])
+            value, error, a, b = _illinois(lambda x: evaluate([x])[0], a, fa,
+                                           b, fb, tol, max_iter)
+            if abs(error) > tol and stage == len(stages) - 1:
+                raise ValueError(
+                    f"No value of {param} hit the target within {max_iter} "
+                    f"iterations. The closest, {value}, misses it by "
+                    f"{error:,.0f}"
+                )
+            # errors at the ends of the final bracket, before the Illinois
+            # method scaled them
+            fa, fb = errors_at[a], errors_at[b]
+            slope = (fb - fa) / (b - a) if b > a else None
+        history = pd.DataFrame(history,
+                               columns=["sample", param, "difference"])
+        return value, history
+
     def weighted_totals(
         self, var: str, include_total: bool = False
     ) -> pd.DataFrame:
@@ -159,21 +824,74 @@ class TaxBrain:
             A Pandas DataFrame with rows for the baseline total,
             reform total, and the difference between the two.
         """
-        base_totals = {}
-        reform_totals = {}
-        differences = {}
-        for year in range(self.start_year, self.end_year + 1):
-            base_totals[year] = (self.base_data[year]["s006"] *
-                                 self.base_data[year][var]).sum()
-            reform_totals[year] = (self.reform_data[year]["s006"] *
-                                   self.reform_data[year][var]).sum()
-            differences[year] = reform_totals[year] - base_totals[year]
+        totals = self.results.weighted_sum(var)
+        base_totals = totals[:, 0]
+        reform_totals = totals[:, 1]
+        differences = reform_totals - base_totals
         table = pd.DataFrame([base_totals, reform_totals, differences],
-                             index=["Base", "Reform", "Difference"])
+                             index=["Base", "Reform", "Difference"],
+                             columns=self.results.years)
         if include_total:
             table["Total"] = table.sum(axis=1)
         return table
 
+    def weighted_totals_se(
+        self, var: str, include_total: bool = False
+    ) -> pd.DataFrame:
+        """
+        Estimate the standard errors of the weighted totals returned by
+        weighted_totals() that come from running the calculators on a
+        sample of the records. The standard errors are zero if all of the
+        records were used.
+
+        Parameters
+        ----------
+        var: str
+            Variable name for variable you want the weighted total of.
+        include_total: bool
+            If true the returned DataFrame will include a "total" columns
+
+        Returns
+        -------
+        Pandas DataFrame
+            A Pandas DataFrame with the standard errors of the baseline
+            total, reform total, and the difference between the two.
+        """
+        index = ["Base", "Reform", "Difference"]
+        columns = list(self.results.years)
+        if include_total:
+            columns.append("Total")
+        if self.sample is None:
+            return pd.DataFrame(0., index=index, columns=columns)
+        # weighted value of each record, years x records x scenarios
+        weights = self.results.array("s006").astype(np.float64)
+        values = self.results.array(var) * weights
+        residuals = np.empty_like(values)
+        for yr_idx in range(len(self.results.years)):
+            for sc_idx in range(len(self.results.SCENARIOS)):
+                residuals[yr_idx, :, sc_idx] = self.sample.residuals(
+                    values[yr_idx, :, sc_idx], weights[yr_idx, :, sc_idx]
+                )
+        residuals = {
+            "Base": residuals[:, :, 0],
+            "Reform": residuals[:, :, 1],
+            "Difference": residuals[:, :, 1] - residuals[:, :, 0]
+        }
+        table = pd.DataFrame(index=index, columns=columns, dtype=np.float64)
+        for row, row_residuals in residuals.items():
+            for year, year_residuals in zip(self.results.years,
+                                            row_residuals):
+                table.loc[row, year] = self.sample.standard_error(
+                    year_residuals
+                )
+            if include_total:
+                # the same records are used in every year, so the residuals
+                # of each year are added up
+                table.loc[row, "Total"] = self.sample.standard_error(
+                    row_residuals.sum(axis=0)
+                )
+        return table
+
     def multi_var_table(
         self, varlist: list, calc: str, include_total: bool = False
     ) -> pd.DataFrame:
@@ -202,18 +920,14 @@ class TaxBrain:
             msg = f"'varlist' is of type {type(varlist)}. Must be a list."
             raise TypeError(msg)
         if calc.upper() == "REFORM":
-            data = self.reform_data
+            scenario = 1
         elif calc.upper() == "BASE":
-            data = self.base_data
+            scenario = 0
         else:
             raise ValueError("'calc' must be 'base' or 'reform'")
-        data_dict = defaultdict(list)
-        for year in range(self.start_year, self.end_year + 1):
-            for var in varlist:
-                data_dict[var] += [weighted_sum(data[year], var)]
-        df = pd.DataFrame(data_dict,
-                          index=range(self.start_year, self.end_year + 1))
-        table = df.transpose()
+        totals = self.results.weighted_sums(varlist)[:, :, scenario]
+        table = pd.DataFrame(totals, index=varlist,
+                             columns=self.results.years)
         if include_total:
             table["Total"] = table.sum(axis=1)
         return table
@@ -256,26 +970,30 @@ class TaxBrain:
             data = self.reform_data[year]
         else:
             raise ValueError("calc must be either BASE or REFORM")
-        # minor data preparation before calling the function
-        if pop_quantiles:
-            data["count"] = data["s006"] * data["XTOT"]
+        # records are grouped by the income of the scenario in the table
+        # unless the baseline income is requested
+        if income_measure == "expanded_income":
+            group_scenario = calc.lower()
+        elif income_measure == "expanded_income_baseline":
+            group_scenario = "base"
         else:
-            data["count"] = data["s006"]
-        data["count_ItemDed"] = data["count"].where(
-            data["c04470"] > 0., 0.
-        )
-        data["count_StandardDed"] = data["count"].where(
-            data["standard"] > 0., 0.
-        )
-        data["count_AMT"] = data["count"].where(
-            data["c09600"] > 0., 0.
-        )
-        if income_measure == "expanded_income_baseline":
-            base_income = self.base_data[year]["expanded_income"]
-            data["expanded_income_baseline"] = base_income
-        table = create_distribution_table(data, groupby, income_measure,
-                                          pop_quantiles)
-        return table
+            raise ValueError(
+                "income_measure must be either 'expanded_income' or "
+                "'expanded_income_baseline'"
+            )
+        key = ("distribution", year, groupby, income_measure, calc.lower(),
+               pop_quantiles,
+               self._versions(year, calc.lower(), group_scenario))
+        if key in self._table_cache:
+            return self._table_cache[key].copy()
+        with self.hooks.phase("table", year, calc.lower(),
+                              table="distribution", groupby=groupby):
+            labels = self.groups.labels(year, groupby, group_scenario,
+                                        pop_quantiles)
+            table = grouped_distribution_table(data, labels, groupby,
+                                               pop_quantiles)
+        self._table_cache[key] = table
+        return table.copy()
 
     def differences_table(self, year: int, groupby: str, tax_to_diff: str,
                           pop_quantiles: bool = False) -> pd.DataFrame:
@@ -303,42 +1021,368 @@ class TaxBrain:
         """
         base_data = self.base_data[year]
         reform_data = self.reform_data[year]
-        table = create_difference_table(base_data, reform_data, groupby,
-                                        tax_to_diff, pop_quantiles)
-        return table
+        key = ("differences", year, groupby, tax_to_diff, pop_quantiles,
+               self._versions(year, "base", "reform"))
+        if key in self._table_cache:
+            return self._table_cache[key].copy()
+        # records are grouped by their baseline income
+        with self.hooks.phase("table", year, table="differences",
+                              groupby=groupby):
+            labels = self.groups.labels(year, groupby, "base", pop_quantiles)
+            table = grouped_difference_table(base_data, reform_data, labels,
+                                             groupby, tax_to_diff,
+                                             pop_quantiles)
+        self._table_cache[key] = table
+        return table.copy()
+
+    def distribution_table_se(self, year: int, groupby: str,
+                              income_measure: str, calc: str,
+                              pop_quantiles: bool = False) -> pd.DataFrame:
+        """
+        Estimate the standard errors of the cells of the table returned by
+        distribution_table() that come from running the calculators on a
+        sample of the records. The standard errors are zero if all of the
+        records were used.
+
+        Parameters
+        ----------
+        year: int
+            which year the distribution table data should be from
+        groupby: str
+            determines how the rows in the table are sorted
+            options: 'weighted_deciles', 'standard_income_bins',
+            'soi_agi_bin'
+        income_measure: str
+            determines which variable is used to sort the rows in
+            the table
+            options: 'expanded_income' or 'expanded_income_baseline'
+        calc: str
+            which calculator to use, can take either
+            `'REFORM'` or `'BASE'`
+        pop_quantiles: bool
+            whether or not weighted_deciles contain equal number of
+            tax units (False) or people (True)
+
+        Returns
+        -------
+        table: Pandas DataFrame
+            standard error of each cell of the distribution table
+        """
+        table = self.distribution_table(year, groupby, income_measure, calc,
+                                        pop_quantiles)
+        if self.sample is None:
+            return pd.DataFrame(0., index=table.index, columns=table.columns)
+        if income_measure == "expanded_income":
+            group_scenario = calc.lower()
+        else:
+            group_scenario = "base"
+        key = ("distribution_se", year, groupby, income_measure,
+               calc.lower(), pop_quantiles,
+               self._versions(year, calc.lower(), group_scenario))
+        if key not in self._table_cache:
+            data = self.results.frame(year, calc.lower())
+            labels = self.groups.labels(year, groupby, group_scenario,
+                                        pop_quantiles)
+            self._table_cache[key] = grouped_distribution_se(
+                data, labels, groupby, self.sample, pop_quantiles
+            )
+        return self._table_cache[key].copy()
+
+    def differences_table_se(self, year: int, groupby: str,
+                             tax_to_diff: str,
+                             pop_quantiles: bool = False) -> pd.DataFrame:
+        """
+        Estimate the standard errors of the cells of the table returned by
+        differences_table() that come from running the calculators on a
+        sample of the records. Standard errors are given for the cells that
+        are weighted totals, and the percentages and means are NaN. The
+        standard errors are zero if all of the records were used.
+
+        Parameters
+        ----------
+        year: int
+            which year the difference table should be from
+        groupby: str
+            determines how the rows in the table are sorted
+            options: 'weighted_deciles', 'standard_income_bins', 'soi_agi_bin'
+        tax_to_diff: str
+            which tax to take the difference of
+            options: 'iitax', 'payrolltax', 'combined'
+        pop_quantiles: bool
+            whether weighted_deciles contain an equal number of tax
+            units (False) or people (True)
+
+        Returns
+        -------
+        table: Pandas DataFrame
+            standard error of each cell of the differences table
+        """
+        table = self.differences_table(year, groupby, tax_to_diff,
+                                       pop_quantiles)
+        if self.sample is None:
+            return pd.DataFrame(0., index=table.index, columns=table.columns)
+        key = ("differences_se", year, groupby, tax_to_diff, pop_quantiles,
+               self._versions(year, "base", "reform"))
+        if key not in self._table_cache:
+            labels = self.groups.labels(year, groupby, "base", pop_quantiles)
+            self._table_cache[key] = grouped_difference_se(
+                self.base_data[year], self.reform_data[year], labels,
+                groupby, tax_to_diff, self.sample, pop_quantiles
+            )
+        return self._table_cache[key].copy()
+
+    def clear_cache(self):
+        """
+        Discard the weighted sums, income groups, and tables computed from
+        the results. The results themselves are kept, and everything
+        discarded is computed again the next time it is used
+
+        Returns
+        -------
+        None
+        """
+        self.results.clear_sums()
+        self.groups = IncomeGroups(self.results)
+        self._table_cache = {}
 
     # ----- private methods -----
-    def _static_run(self, varlist, base_calc, reform_calc):
+    def _reset_results(self, directory=None):
         """
-        Run the calculator for a static analysis
+        Create an empty results store and the base_data and reform_data
+        accessors used to read from it. Any tables computed from earlier
+        results and the sample they came from are discarded. If a
+        directory is given, the results are kept in memory mapped files
+        there
         """
-        if "s006" not in varlist:  # ensure weight is always included
-            varlist.append("s006")
+        self.results = ResultsStore(range(self.start_year, self.end_year + 1),
+                                    self.result_dtype, directory)
+        self.base_data = ScenarioData(self.results, "base")
+        self.reform_data = ScenarioData(self.results, "reform")
+        # income groups and tables computed from the results
+        self.groups = IncomeGroups(self.results)
+        self._table_cache = {}
+        self.sample = None
 
-        for yr in range(self.start_year, self.end_year + 1):
-            base_calc.advance_to_year(yr)
-            reform_calc.advance_to_year(yr)
-            # run calculations in parallel
-            delay = [delayed(base_calc.calc_all()),
-                     delayed(reform_calc.calc_all())]
-            compute(*delay)
-            self.base_data[yr] = base_calc.dataframe(varlist)
-            self.reform_data[yr] = reform_calc.dataframe(varlist)
+    def _versions(self, year, *scenarios):
+        """
+        Versions of the results a table for a year is computed from. They
+        are part of the keys of cached tables, so a table is computed again
+        once any of the results it uses are replaced
+        """
+        return tuple(self.results.version(year, scenario)
+                     for scenario in scenarios)
 
-    def _dynamic_run(self, varlist, base_calc, reform_calc):
+    def _static_run(self, varlist, client, num_workers, use_cache,
+                    cache_dir, checkpoint=None):
         """
-        Run a dynamic response
+        Run the calculator for a static analysis. Years already held in
+        base_data or reform_data are not run again, and a calculator is
+        only created if it has years left to run
         """
-        if "s006" not in varlist:  # ensure weight is always included
-            varlist.append("s006")
-        for year in range(self.start_year, self.end_year + 1):
-            base_calc.advance_to_year(year)
-            reform_calc.advance_to_year(year)
-            base, reform = behresp.response(base_calc, reform_calc,
-                                            self.params["behavior"],
-                                            dump=True)
-            self.base_data[year] = base[varlist]
-            self.reform_data[year] = reform[varlist]
+        cached_base = None
+        if use_cache:
+            cache_key = self._baseline_key(varlist)
+            cached_base = BASELINE_CACHE.get(cache_key, cache_dir)
+            if cached_base is not None:
+                if self.verbose:
+                    print("Using cached baseline results")
+                self.base_data.update(cached_base)
+
+        years = list(range(self.start_year, self.end_year + 1))
+        # the reform only needs to be run once it differs from the baseline
+        reform_years = self._reform_years()
+        base_years = [yr for yr in years if yr not in self.base_data]
+        reform_years_left = [yr for yr in reform_years
+                             if yr not in self.reform_data]
+        calcs = {}
+        if base_years or reform_years_left:
+            records = self._make_records()
+            if base_years:
+                calcs["base"] = (
+                    self._make_calculator(
+                        records, self.params["growdiff_baseline"],
+                        [self.params["base_policy"]], "base"
+                    ),
+                    base_years
+                )
+            if reform_years_left:
+                calcs["reform"] = (
+                    self._make_calculator(
+                        records, self.params["growdiff_response"],
+                        [self.params["base_policy"], self.params["policy"]],
+                        "reform"
+                    ),
+                    reform_years_left
+                )
+            del records
+        elif self.sample_frac is not None:
+            # the sample is still needed for the standard errors
+            microdata, positions, weights, factors = self._records_inputs()
+            self._draw_sample(microdata, weights.iloc[positions], factors)
+        results = {"base": {}, "reform": {}}
+        results.update(_run_calculators(calcs, varlist, client, num_workers,
+                                        checkpoint, self.hooks))
+        del calcs
+        self.base_data.update(results["base"])
+        self.reform_data.update(results["reform"])
+        for yr in years:
+            if yr not in reform_years:
+                self.reform_data[yr] = self.base_data[yr]
+
+        if use_cache and cached_base is None:
+            base_results = {yr: self.base_data[yr].copy() for yr in years}
+            BASELINE_CACHE.put(cache_key, base_results, cache_dir)
+
+    def _dynamic_run(self, varlist, base_calc, reform_calc, client,
+                     num_workers, checkpoint=None):
+        """
+        Run a dynamic response. The years are split into contiguous chunks
+        and each chunk is run by its own pair of calculators. Years already
+        held in base_data and reform_data are not run again
+        """
+        years = [
+            yr for yr in range(self.start_year, self.end_year + 1)
+            if yr not in self.base_data or yr not in self.reform_data
+        ]
+        if not years:
+            return
+        reform_years = self._reform_years()
+        if client:
+            num_chunks = len(years)
+        else:
+            num_chunks = min(len(years), max(1, num_workers))
+        tasks = [
+            delayed(_run_years)(base_calc, reform_calc, chunk, varlist,
+                                self.params["behavior"], reform_years,
+                                checkpoint, self.hooks)
+            for chunk in _year_chunks(years, num_chunks)
+        ]
+        for results in _compute(tasks, client, num_workers):
+            for year, (base, reform) in results.items():
+                self.base_data[year] = base
+                self.reform_data[year] = reform
+
+    def _chunked_run(self, varlist, chunk_size):
+        """
+        Run the calculators on one partition of the records at a time and
+        write the results of each partition into the results store as soon
+        as they are finished
+        """
+        years = list(range(self.start_year, self.end_year + 1))
+        reform_years = self._reform_years()
+        num_records, chunks = self._records_chunks(chunk_size)
+        start = 0
+        for records in chunks:
+            base_calc, reform_calc = self._make_calculators(records)
+            del records
+            output = _run_years(base_calc, reform_calc, years, varlist,
+                                self.params["behavior"], reform_years,
+                                hooks=self.hooks)
+            del base_calc, reform_calc
+            for year in years:
+                base, reform = output.pop(year)
+                self.results.set_rows(year, "base", base, start, num_records)
+                self.results.set_rows(year, "reform", reform, start)
+            start += len(base.index)
+            del output, base, reform
+
+    def _sharded_run(self, varlist, num_shards, client, num_workers):
+        """
+        Split the records into partitions that are run at the same time and
+        write the results of each partition into the results store. Only
+        the positions of each partition are sent to the workers, which
+        read their records and create their own calculators
+        """
+        years = list(range(self.start_year, self.end_year + 1))
+        reform_years = self._reform_years()
+        num_records, partitions = self._records_partitions(num_shards)
+        worker_tb = self._worker_copy()
+        tasks = [
+            delayed(_run_partition)(worker_tb, microdata, start, stop,
+                                    weights, factors, varlist, years,
+                                    reform_years, i)
+            for i, (microdata, start, stop, weights, factors)
+            in enumerate(partitions)
+        ]
+        del partitions
+        # results are returned in the same order as the tasks
+        outputs = _compute(tasks, client, num_workers)
+        start = 0
+        for output in outputs:
+            for year in years:
+                base, reform = output.pop(year)
+                self.results.set_rows(year, "base", base, start, num_records)
+                self.results.set_rows(year, "reform", reform, start)
+            start += len(base.index)
+            del output, base, reform
+
+    def _first_reform_year(self):
+        """
+        Find the first year in which the reform calculator can produce
+        different results than the baseline calculator. Returns None if the
+        two calculators are the same in every year
+        """
+        years = []
+        if self.params["policy"]:
+            years.append(_first_year(self.params["policy"]))
+        growdiff_baseline = self.params["growdiff_baseline"]
+        growdiff_response = self.params["growdiff_response"]
+        if growdiff_response != growdiff_baseline:
+            for growdiff in [growdiff_baseline, growdiff_response]:
+                if growdiff:
+                    years.append(_first_year(growdiff))
+        if not years:
+            return None
+        return min(years)
+
+    def _reform_years(self):
+        """
+        Years in the analysis that the reform calculator needs to be run for
+        """
+        first_year = self._first_reform_year()
+        if first_year is None:
+            return []
+        return list(range(max(first_year, self.start_year),
+                          self.end_year + 1))
+
+    def _param_reform_years(self, years):
+        """
+        Years that the reform calculator needs to be run for when a policy
+        parameter is also set in the given years
+        """
+        first_year = self._first_reform_year()
+        if first_year is None or first_year > min(years):
+            first_year = min(years)
+        return list(range(max(first_year, self.start_year),
+                          self.end_year + 1))
+
+    def _baseline_key(self, varlist):
+        """
+        Key used to look up cached baseline results. It is based on all of
+        the inputs that affect the baseline calculator. Like the checkpoint
+        key, it hashes the variables in sorted order
+        """
+        return hash_inputs(
+            hash_microdata(self.microdata), self.use_cps,
+            self.params["base_policy"], self.params["growdiff_baseline"],
+            self.start_year, self.end_year, sorted(varlist),
+            self.result_dtype,
+            self.sample_frac, self.sample_seed, TaxBrain.VERSIONS
+        )
+
+    def _run_key(self, varlist):
+        """
+        Key used to check that checkpointed results came from a run with
+        the same inputs. The results for a year do not depend on the other
+        years in the analysis, so the start and end years are left out.
+        The variables are sorted so the key does not depend on their order,
+        which for the default variables changes between processes
+        """
+        return hash_inputs(
+            hash_microdata(self.microdata), self.use_cps, self.params,
+            sorted(varlist), self.result_dtype, self.sample_frac,
+            self.sample_seed, TaxBrain.VERSIONS
+        )
 
     def _process_user_mods(self, reform, assump):
         """
@@ -402,51 +1446,704 @@ class TaxBrain:
 
         return params
 
-    def _make_calculators(self):
+    def _child(self, reform):
+        """
+        Create a TaxBrain object for a reform that shares the baseline,
+        assumptions, micro-data, and sample of this one
+        """
+        assump = {
+            key: self.params[key] for key in tc.Calculator.REQUIRED_ASSUMP_KEYS
+        }
+        tb = TaxBrain(self.start_year, self.end_year,
+                      microdata=self.microdata, use_cps=self.use_cps,
+                      reform=reform, assump=assump,
+                      base_policy=self.params["base_policy"],
+                      verbose=self.verbose, result_dtype=self.result_dtype,
+                      sample=self.sample_frac, sample_seed=self.sample_seed)
+        tb.hooks = self.hooks
+        return tb
+
+    def _run_reforms(self, tbs, calcs, varlist, client, num_workers):
+        """
+        Run the baseline calculator once and a reform calculator for each
+        TaxBrain object in tbs, then store the results in those objects.
+        calcs holds the growdiff, the list of policy reforms implemented in
+        order, and the years the reform calculator is run for of each one
+        """
+        if self.params["behavior"]:
+            raise ValueError("Only static runs are supported")
+        if not isinstance(varlist, list):
+            msg = f"'varlist' is of type {type(varlist)}. Must be a list."
+            raise TypeError(msg)
+        if "s006" not in varlist:  # ensure weight is always included
+            varlist.append("s006")
+        # the sample is drawn again if one is used
+        self.sample = None
+        records = self._make_records()
+        years = list(range(self.start_year, self.end_year + 1))
+        calculators = {
+            "base": (
+                self._make_calculator(
+                    records, self.params["growdiff_baseline"],
+                    [self.params["base_policy"]], "base"
+                ),
+                years
+            )
+        }
+        for i, (growdiff, policy_mods, reform_years) in enumerate(calcs):
+            calc = self._make_calculator(records, growdiff, policy_mods,
+                                         "reform")
+            calculators[i] = (calc, reform_years)
+        del records
+        results = _run_calculators(calculators, varlist, client, num_workers,
+                                   hooks=self.hooks)
+        for i, tb in enumerate(tbs):
+            tb.sample = self.sample
+            tb.base_data.update(results["base"])
+            tb.reform_data.update(results.pop(i))
+            for yr in years:
+                if yr not in tb.reform_data:
+                    tb.reform_data[yr] = results["base"][yr]
+            setattr(tb, "has_run", True)
+
+    def _make_calculators(self, records=None):
         """
         This function creates the baseline and reform calculators used when
-        the `run()` method is called
-        """
-        # Create two microsimulation calculators
-        gd_base = tc.GrowDiff()
-        gf_base = tc.GrowFactors()
-        # apply user specified growdiff
-        if self.params["growdiff_baseline"]:
-            gd_base.update_growdiff(self.params["growdiff_baseline"])
-            gd_base.apply_to(gf_base)
-        # Baseline calculator
+        the `run()` method is called. If records are given, such as a
+        partition of the micro-data, the calculators use them
+        """
+        # The microdata are only read and validated once. Each Calculator
+        # works with its own copy of the records
+        if records is None:
+            records = self._make_records()
+        base_calc = self._make_calculator(
+            records, self.params["growdiff_baseline"],
+            [self.params["base_policy"]], "base"
+        )
+        reform_calc = self._make_calculator(
+            records, self.params["growdiff_response"],
+            [self.params["base_policy"], self.params["policy"]], "reform"
+        )
+        # delete all unneeded variables
+        del records
+        return base_calc, reform_calc
+
+    def _make_records(self):
+        """
+        Create the Records object used by the calculators
+        """
+        if self.sample_frac is not None:
+            # the sampled records are built like a partition of the records
+            _, chunks = self._records_chunks(num_chunks=1)
+            return next(chunks)
+        # Creating a Records object does not use the growth factors, so the
+        # defaults are used here and each calculator sets its own
+        with self.hooks.phase("records"):
+            microdata = read_microdata(self.microdata)
+            gfactors = DEFAULTS_CACHE.growfactors()
+            if self.use_cps:
+                records = tc.Records.cps_constructor(
+                    data=microdata, gfactors=gfactors
+                )
+            else:
+                records = tc.Records(microdata, gfactors=gfactors)
+        return records
+
+    def _records_chunks(self, chunk_size=None, num_chunks=None):
+        """
+        Split the micro-data into consecutive partitions, each with at most
+        chunk_size records or, if num_chunks is given, into that many
+        partitions of about the same size. Returns the total number of
+        records and a generator of the Records object for each partition.
+        Each record gets the same sample weights it would have if all of the
+        micro-data were read at once. If a sample of the records is used,
+        only the sampled records are partitioned
+        """
+        microdata, positions, weights, factors = self._records_inputs()
+        if self.sample_frac is not None:
+            microdata, factors = self._draw_sample(
+                microdata, weights.iloc[positions], factors
+            )
+            positions = microdata_positions(microdata)
+        num_records = len(positions)
+        if num_chunks:
+            chunk_size = max(1, -(-num_records // num_chunks))
+        del positions
+        return num_records, self._chunk_records(microdata, weights, factors,
+                                                chunk_size)
+
+    def _chunk_records(self, microdata, weights, factors, chunk_size):
+        """
+        Create the Records object for each partition of the micro-data
+        """
+        chunks = microdata_chunks(microdata, chunk_size)
+        start = 0
+        for i, (chunk_positions, chunk) in enumerate(chunks):
+            chunk_factors = factors
+            if factors is not None and factors.ndim == 2:
+                chunk_factors = factors[start:start + len(chunk_positions)]
+            yield self._weighted_records(chunk, weights.iloc[chunk_positions],
+                                         chunk_factors, chunk=i)
+            start += len(chunk_positions)
+
+    def _records_partitions(self, num_partitions):
+        """
+        Split the records into partitions of consecutive records that
+        worker processes can read on their own. Returns the total number of
+        records and, for each partition, the micro-data to read it from,
+        the positions of its first and last records in that micro-data, its
+        weights, and the factors that scale the weights. Files are read by
+        the workers, while partitions of micro-data already in memory are
+        sliced here
+        """
+        microdata, positions, weights, factors = self._records_inputs()
+        if self.sample_frac is not None:
+            microdata, factors = self._draw_sample(
+                microdata, weights.iloc[positions], factors
+            )
+            positions = microdata_positions(microdata)
+        elif isinstance(self.microdata, (str, Path)):
+            # memory mapped files are opened again by each worker
+            microdata = self.microdata
+        num_records = len(positions)
+        size = max(1, -(-num_records // num_partitions))
+        partitions = []
+        for start in range(0, num_records, size):
+            stop = min(start + size, num_records)
+            part_factors = factors
+            if factors is not None and factors.ndim == 2:
+                part_factors = factors[start:stop]
+            part = (microdata, start, stop)
+            if isinstance(microdata, pd.DataFrame):
+                part = (microdata.iloc[start:stop], 0, stop - start)
+            partitions.append(
+                part + (weights.iloc[positions[start:stop]], part_factors)
+            )
+        return num_records, partitions
+
+    def _worker_copy(self):
+        """
+        Copy of this object without its micro-data or results, sent to the
+        worker processes that create their own calculators
+        """
+        tb = copy.copy(self)
+        tb.microdata = None
+        tb._reset_results()
+        return tb
+
+    def _records_inputs(self):
+        """
+        Find the micro-data and read the weights file used to create Records
+        objects. Returns the micro-data, the position of each of its records
+        in the weights file, the weights, and the factors the weights are
+        scaled by for each year, or None if they are not scaled
+        """
+        microdata = read_microdata(self.microdata)
         if self.use_cps:
-            records = tc.Records.cps_constructor(data=self.microdata,
-                                                 gfactors=gf_base)
+            if microdata is None:
+                microdata = os.path.join(tc.Records.CODE_PATH, "cps.csv.gz")
+            weights_file = tc.Records.CPS_WEIGHTS_FILENAME
         else:
-            records = tc.Records(self.microdata, gfactors=gf_base)
-        policy = tc.Policy(gf_base)
-        if self.params["base_policy"]:
-            update_policy(policy, self.params["base_policy"])
-        base_calc = tc.Calculator(policy=policy,
-                                  records=records,
-                                  verbose=self.verbose)
-
-        # Reform calculator
-        # Initialize a policy object
-        gd_reform = tc.GrowDiff()
-        gf_reform = tc.GrowFactors()
-        if self.params["growdiff_response"]:
-            gd_reform.update_growdiff(self.params["growdiff_response"])
-            gd_reform.apply_to(gf_reform)
+            weights_file = tc.Records.PUF_WEIGHTS_FILENAME
+        weights = pd.read_csv(
+            os.path.join(tc.Records.CODE_PATH, weights_file)
+        ).astype(np.int32)
+        positions = microdata_positions(microdata)
+        # Tax-Calculator scales up the weights of a sub-sample so they add
+        # up to the weights of the full sample
+        factors = None
+        if len(positions) < len(weights.index):
+            factors = (weights.sum() / weights.iloc[positions].sum()).values
+        return microdata, positions, weights, factors
+
+    def _weighted_records(self, data, weights, factors=None, **tags):
+        """
+        Create a Records object for part of the micro-data with the given
+        weights. factors scale the weights, either one for each year or one
+        for each record and year. tags are added to the hook events
+        """
         if self.use_cps:
-            records = tc.Records.cps_constructor(data=self.microdata,
-                                                 gfactors=gf_reform)
+            start_year = tc.Records.CPSCSV_YEAR
+            ratios = tc.Records.CPS_RATIOS_FILENAME
         else:
-            records = tc.Records(self.microdata, gfactors=gf_reform)
-        policy = tc.Policy(gf_reform)
-        if self.params["base_policy"]:
-            update_policy(policy, self.params["base_policy"])
-        update_policy(policy, self.params["policy"])
-
-        # Initialize Calculator
-        reform_calc = tc.Calculator(policy=policy, records=records,
-                                    verbose=self.verbose)
-        # delete all unneeded variables
-        del gd_base, gd_reform, records, gf_base, gf_reform, policy
-        return base_calc, reform_calc
+            start_year = tc.Records.PUFCSV_YEAR
+            ratios = tc.Records.PUF_RATIOS_FILENAME
+        with self.hooks.phase("records", **tags):
+            records = tc.Records(
+                data, start_year=start_year,
+                gfactors=DEFAULTS_CACHE.growfactors(), weights=weights,
+                adjust_ratios=ratios
+            )
+            if factors is not None:
+                records.WT *= factors
+                wt_colname = f"WT{records.current_year}"
+                if wt_colname in records.WT.columns:
+                    records.s006 = records.WT[wt_colname] * 0.01
+        return records
+
+    def _draw_sample(self, microdata, weights, factors=None):
+        """
+        Draw the stratified sample of the micro-data used in the run. Returns
+        the sampled records and the factors that scale the weights of each
+        one for every year
+        """
+        if not isinstance(microdata, pd.DataFrame):
+            microdata = pd.read_csv(microdata)
+        sample = StratifiedSample.draw(microdata, self.sample_frac,
+                                       self.sample_seed)
+        sample_factors = sample.weight_factors(weights)
+        if factors is not None:
+            sample_factors *= factors
+        self.sample = sample
+        return microdata.iloc[sample.positions], sample_factors
+
+    def _make_calculator(self, records, growdiff, policy_mods,
+                         scenario=None):
+        """
+        Create a calculator that uses the given records
+
+        Parameters
+        ----------
+        records: Tax-Calculator Records object
+            records used by the calculator. The calculator works with a copy
+            of the records
+        growdiff: dict
+            growth assumptions applied to the default growth factors
+        policy_mods: list
+            policy reforms implemented in order. Empty reforms are skipped
+        scenario: str
+            scenario the calculator is for, used to tag hook events
+
+        Returns
+        -------
+        calc: Tax-Calculator Calculator object
+        """
+        # default growth factors with the user specified growdiff applied
+        gfactors = DEFAULTS_CACHE.growfactors(growdiff)
+        records.gfactors = gfactors
+        with self.hooks.phase("policy", scenario=scenario):
+            policy = DEFAULTS_CACHE.policy(growdiff)
+            for mods in policy_mods:
+                if mods:
+                    update_policy(policy, mods)
+        calc = tc.Calculator(policy=policy, records=records,
+                             verbose=self.verbose)
+        del gfactors, policy
+        return calc
+
+
+# ----- helper functions -----
+def _run_calculator(calc, years, varlist, checkpoint=None, scenario=None,
+                    hooks=None):
+    """
+    Advance a calculator through the given years and return the specified
+    variables for each one
+
+    Parameters
+    ----------
+    calc: Tax-Calculator Calculator object
+        calculator to run
+    years: list
+        years to run the calculator for, in ascending order
+    varlist: list
+        variables to return for each year
+    checkpoint: Checkpoint object
+        checkpoint each year's results are saved to. If None, the results
+        are not saved
+    scenario: str
+        scenario the results are saved under, 'base' or 'reform'
+    hooks: Hooks object
+        hooks called at the start and end of each phase of the run
+
+    Returns
+    -------
+    results: dict
+        Pandas DataFrame with the variables in varlist for each year
+    """
+    if hooks is None:
+        hooks = Hooks()
+    results = {}
+    for year in years:
+        with hooks.phase("advance_to_year", year, scenario):
+            calc.advance_to_year(year)
+        with hooks.phase("calc_all", year, scenario):
+            calc.calc_all()
+        with hooks.phase("dataframe", year, scenario):
+            results[year] = calc.dataframe(varlist)
+        if checkpoint:
+            checkpoint.save(year, scenario, results[year])
+    return results
+
+
+def _run_partition(tb, microdata, start, stop, weights, factors, varlist,
+                   years, reform_years, partition):
+    """
+    Read a partition of the records, create the calculators for it, and run
+    them for several years
+
+    Parameters
+    ----------
+    tb: TaxBrain object
+        TaxBrain object with the policy and assumptions of the run
+    microdata: str or Pandas DataFrame
+        micro-data the partition is read from
+    start: int
+        position of the first record of the partition in microdata
+    stop: int
+        position after the last record of the partition in microdata
+    weights: Pandas DataFrame
+        sample weights of the records in the partition
+    factors: Numpy array
+        factors that scale the weights, or None
+    varlist: list
+        variables to return for each year
+    years: list
+        years to run, in ascending order
+    reform_years: list
+        years in which the reform calculator needs to be run
+    partition: int
+        number of the partition, used to tag hook events
+
+    Returns
+    -------
+    output: dict
+        tuple of the baseline and reform results for each year
+    """
+    data = read_partition(microdata, start, stop)
+    records = tb._weighted_records(data, weights, factors, chunk=partition)
+    del data
+    base_calc, reform_calc = tb._make_calculators(records)
+    del records
+    return _run_years(base_calc, reform_calc, years, varlist,
+                      tb.params["behavior"], reform_years, hooks=tb.hooks)
+
+
+def _run_year(base_calc, reform_calc, year, varlist, behavior,
+              run_reform=True, hooks=None):
+    """
+    Run the baseline and reform calculators for a single year
+
+    Parameters
+    ----------
+    base_calc: Tax-Calculator Calculator object
+        baseline calculator
+    reform_calc: Tax-Calculator Calculator object
+        reform calculator
+    year: int
+        year to run the calculators for
+    varlist: list
+        variables to return
+    behavior: dict
+        behavioral assumptions. If empty, a static run is done
+    run_reform: bool
+        whether the reform calculator needs to be run. If False, the reform
+        is known to match the baseline in this year and a copy of the
+        baseline results is returned for it
+    hooks: Hooks object
+        hooks called at the start and end of each phase of the run
+
+    Returns
+    -------
+    base: Pandas DataFrame
+        variables in varlist from the baseline calculator
+    reform: Pandas DataFrame
+        variables in varlist from the reform calculator
+    """
+    if hooks is None:
+        hooks = Hooks()
+    with hooks.phase("advance_to_year", year, "base"):
+        base_calc.advance_to_year(year)
+    if not run_reform:
+        with hooks.phase("calc_all", year, "base"):
+            base_calc.calc_all()
+        with hooks.phase("dataframe", year, "base"):
+            base = base_calc.dataframe(varlist)
+        return base, base.copy()
+    with hooks.phase("advance_to_year", year, "reform"):
+        reform_calc.advance_to_year(year)
+    if behavior:
+        with hooks.phase("response", year):
+            base, reform = behresp.response(base_calc, reform_calc,
+                                            behavior, dump=True)
+        return base[varlist], reform[varlist]
+    calcs = {"base": base_calc, "reform": reform_calc}
+    for scenario, calc in calcs.items():
+        with hooks.phase("calc_all", year, scenario):
+            calc.calc_all()
+    results = []
+    for scenario, calc in calcs.items():
+        with hooks.phase("dataframe", year, scenario):
+            results.append(calc.dataframe(varlist))
+    return tuple(results)
+
+
+def _run_years(base_calc, reform_calc, years, varlist, behavior,
+               reform_years, checkpoint=None, hooks=None):
+    """
+    Run the baseline and reform calculators for several years
+
+    Parameters
+    ----------
+    base_calc: Tax-Calculator Calculator object
+        calculator for the baseline policy
+    reform_calc: Tax-Calculator Calculator object
+        calculator for the reform policy
+    years: list
+        years to run, in ascending order
+    varlist: list
+        variables to return for each year
+    behavior: dict
+        behavioral assumptions. If empty, a static run is done
+    reform_years: list
+        years in which the reform calculator needs to be run
+    checkpoint: Checkpoint object
+        checkpoint each year's results are saved to. If None, the results
+        are not saved
+    hooks: Hooks object
+        hooks called at the start and end of each phase of the run
+
+    Returns
+    -------
+    output: dict
+        tuple of the baseline and reform results for each year
+    """
+    output = {}
+    for year in years:
+        base, reform = _run_year(base_calc, reform_calc, year, varlist,
+                                 behavior, year in reform_years, hooks)
+        if checkpoint:
+            checkpoint.save(year, "base", base)
+            checkpoint.save(year, "reform", reform)
+        output[year] = (base, reform)
+    return output
+
+
+def _run_calculators(calcs, varlist, client, num_workers, checkpoint=None,
+                     hooks=None):
+    """
+    Run several calculators through the years assigned to them. The years
+    are split across the available workers and each task receives its own
+    copy of the calculator it runs.
+
+    Parameters
+    ----------
+    calcs: dict
+        tuples of a Tax-Calculator Calculator object and the list of years,
+        in ascending order, to run it for
+    varlist: list
+        variables to return for each year
+    client: Dask Client object
+        client used to run the calculators. If None, a local scheduler is
+        used
+    num_workers: int
+        number of worker processes used by the local scheduler
+    checkpoint: Checkpoint object
+        checkpoint each year's results are saved to, under the calculator's
+        key. If None, the results are not saved
+    hooks: Hooks object
+        hooks called at the start and end of each phase of the run. Events
+        are tagged with the calculator's key as the scenario
+
+    Returns
+    -------
+    output: dict
+        dictionary with the same keys as calcs that maps to the Pandas
+        DataFrame with the variables in varlist for each year
+    """
+    tasks = []
+    for key, (calc, years) in calcs.items():
+        if not years:
+            continue
+        if client:
+            num_chunks = len(years)
+        else:
+            num_chunks = min(len(years), max(1, num_workers // len(calcs)))
+        for chunk in _year_chunks(years, num_chunks):
+            task = delayed(_run_calculator)(calc, chunk, varlist,
+                                            checkpoint, key, hooks)
+            tasks.append((key, task))
+    results = _compute([task for _, task in tasks], client, num_workers)
+    output = {key: {} for key in calcs}
+    for (key, _), result in zip(tasks, results):
+        output[key].update(result)
+    return output
+
+
+def _param_labels(meta):
+    """
+    Find the labels, such as MARS or EIC, that a policy parameter is
+    indexed by
+
+    Parameters
+    ----------
+    meta: dict
+        metadata of the parameter, as given by Policy.metadata()
+
+    Returns
+    -------
+    list
+        sorted labels of the parameter. Empty for scalar parameters
+    """
+    labels = set()
+    for value in meta["value"]:
+        labels.update(value.keys())
+    return sorted(labels - {"value", "year", "_auto"})
+
+
+def _first_year(mods):
+    """
+    Find the first year in which a policy reform or growdiff changes
+    anything
+
+    Parameters
+    ----------
+    mods: dict
+        reform in either the Tax-Calculator or ParamTools format
+
+    Returns
+    -------
+    int
+        first year affected by the modifications. If this cannot be
+        determined, the first year allowed in Tax-Calculator is returned
+    """
+    first_year = TaxBrain.FIRST_BUDGET_YEAR
+    years = []
+    try:
+        for param, value in mods.items():
+            if isinstance(value, dict):
+                # Tax-Calculator format: {param: {year: value}}
+                years.extend(int(yr) for yr in value.keys())
+            elif isinstance(value, list) and value and all(
+                isinstance(adj, dict) for adj in value
+            ):
+                # ParamTools format: {param: [{"year": year, ...}]}
+                for adj in value:
+                    if "year" not in adj:
+                        return first_year  # applies to every year
+                    years.append(int(adj["year"]))
+            else:
+                return first_year
+    except (TypeError, ValueError):
+        return first_year
+    if not years:
+        return first_year
+    return max(min(years), first_year)
+
+
+def _illinois(func, a, fa, b, fb, tol, max_iter):
+    """
+    Find a root of a function with the Illinois variant of the regula falsi
+    method. The root stays bracketed, as with bisection, but the method
+    converges about as fast as the secant method
+
+    Parameters
+    ----------
+    func: callable
+        function to find the root of
+    a: float
+        one end of the bracket
+    fa: float
+        value of the function at a
+    b: float
+        other end of the bracket. func(b) must have the opposite sign of fa
+    fb: float
+        value of the function at b
+    tol: float
+        the search stops once the absolute value of the function is at most
+        tol
+    max_iter: int
+        largest number of times the function is evaluated
+
+    Returns
+    -------
+    root: float
+        point with the smallest absolute value of the function
+    froot: float
+        value of the function at root. The search converged if its
+        absolute value is at most tol
+    a: float
+        lower end of the final bracket
+    b: float
+        upper end of the final bracket
+    """
+    root, froot = (a, fa) if abs(fa) <= abs(fb) else (b, fb)
+    side = 0
+    for _ in range(max_iter):
+        if abs(froot) <= tol or fa == fb:
+            break
+        x = (a * fb - b * fa) / (fb - fa)
+        if x in (a, b):
+            # the bracket cannot get any smaller
+            break
+        fx = func(x)
+        if abs(fx) < abs(froot):
+            root, froot = x, fx
+        if fx * fb > 0:
+            b, fb = x, fx
+            if side == -1:
+                # halve the value kept at the other end so it moves too
+                fa /= 2
+            side = -1
+        elif fx * fa > 0:
+            a, fa = x, fx
+            if side == 1:
+                fb /= 2
+            side = 1
+        else:
+            break
+    return root, froot, min(a, b), max(a, b)
+
+
+def _year_chunks(years, num_chunks):
+    """
+    Split a list of years into contiguous chunks of roughly equal size
+
+    Parameters
+    ----------
+    years: list
+        years to split
+    num_chunks: int
+        number of chunks to create
+
+    Returns
+    -------
+    chunks: list
+        list of lists of years
+    """
+    chunk_size, remainder = divmod(len(years), num_chunks)
+    chunks = []
+    start = 0
+    for i in range(num_chunks):
+        end = start + chunk_size + (i < remainder)
+        chunks.append(years[start:end])
+        start = end
+    return chunks
+
+
+def _compute(lazy_values, client, num_workers):
+    """
+    Compute a list of Dask delayed objects
+
+    Parameters
+    ----------
+    lazy_values: list
+        Dask delayed objects to compute
+    client: Dask Client object
+        client used to compute the delayed objects. If None, a local
+        scheduler is used
+    num_workers: int
+        number of worker processes used by the local scheduler. The
+        delayed objects are computed in the current process when this is one
+
+    Returns
+    -------
+    list
+        results of each delayed object
+    """
+    if client:
+        futures = client.compute(lazy_values)
+        return client.gather(futures)
+    if num_workers > 1:
+        return compute(*lazy_values, scheduler="processes",
+                       num_workers=num_workers)
+    return compute(*lazy_values, scheduler="synchronous")
@@ -1,6 +1,7 @@
 import os
 import pytest
 import pandas as pd
+import taxcalc as tc
 from taxbrain import TaxBrain
 
 
@@ -54,6 +55,14 @@ def tb_dynamic(reform_json_str):
                     behavior={"sub": 0.25})
 
 
+@pytest.fixture(scope="session")
+def cps_subsample():
+    # small sample of the CPS file for tests that run several calculators
+    # at the same time
+    cps = pd.read_csv(os.path.join(tc.Records.CODE_PATH, "cps.csv.gz"))
+    return cps.sample(frac=0.1, random_state=123)
+
+
 @pytest.fixture(scope="session")
 def empty_mods():
     return {"consumption": {}, "growdiff_response": {}, "policy": {},
@@ -1,8 +1,15 @@
+import gc
 import os
+import sys
+import subprocess
+import tracemalloc
 import pytest
 import pandas as pd
 import numpy as np
 from taxbrain import TaxBrain
+from taxbrain.taxbrain import (_year_chunks, _first_year, _run_calculator,
+                               _illinois, _compute)
+from taxbrain.cache import BASELINE_CACHE
 
 
 def test_arg_validation():
@@ -17,6 +24,9 @@ def test_arg_validation():
         TaxBrain(TaxBrain.FIRST_BUDGET_YEAR - 1, 2018, use_cps=True)
     with pytest.raises(AssertionError):
         TaxBrain(2018, TaxBrain.LAST_BUDGET_YEAR + 1, use_cps=True)
+    with pytest.raises(ValueError):
+        TaxBrain(2018, 2018, use_cps=True).run(cache_dir="results",
+                                               checkpoint_dir="results/")
 
 
 def test_static_run(tb_static):
@@ -25,6 +35,314 @@ def test_static_run(tb_static):
     tb_static.run()
 
 
+def test_static_run_parallel(tb_static, reform_json_str):
+    if not tb_static.has_run:
+        tb_static.run()
+    tb = TaxBrain(2018, 2019, use_cps=True, reform=reform_json_str)
+    tb.run(num_workers=2)
+    for year in range(2018, 2020):
+        pd.testing.assert_frame_equal(tb.base_data[year],
+                                      tb_static.base_data[year])
+        pd.testing.assert_frame_equal(tb.reform_data[year],
+                                      tb_static.reform_data[year])
+
+
+def test_checkpoint(cps_subsample, reform_json_str, tmp_path,
+                    monkeypatch):
+    tb = TaxBrain(2018, 2019, microdata=cps_subsample, use_cps=True,
+                  reform=reform_json_str)
+    tb.run(checkpoint_dir=tmp_path)
+    # the reform first changes policy in 2019
+    saved = sorted(path.name for path in tmp_path.glob("*.pkl"))
+    assert saved == ["2018_base.pkl", "2019_base.pkl", "2019_reform.pkl"]
+
+    def run_calculator(calc, years, varlist, checkpoint=None, scenario=None,
+                       hooks=None):
+        run_years.extend((year, scenario) for year in years)
+        return _run_calculator(calc, years, varlist, checkpoint, scenario,
+                               hooks)
+
+    run_years = []
+    monkeypatch.setattr(sys.modules["taxbrain.taxbrain"], "_run_calculator",
+                        run_calculator)
+    # a rerun with the same inputs only loads the saved results
+    tb_rerun = TaxBrain(2018, 2019, microdata=cps_subsample, use_cps=True,
+                        reform=reform_json_str)
+    tb_rerun.run(checkpoint_dir=tmp_path)
+    assert run_years == []
+    for year in range(2018, 2020):
+        pd.testing.assert_frame_equal(tb_rerun.base_data[year],
+                                      tb.base_data[year])
+        pd.testing.assert_frame_equal(tb_rerun.reform_data[year],
+                                      tb.reform_data[year])
+    # only the missing results are run after an interrupted run
+    (tmp_path / "2019_reform.pkl").unlink()
+    tb_rerun.run(checkpoint_dir=tmp_path)
+    assert run_years == [(2019, "reform")]
+    pd.testing.assert_frame_equal(tb_rerun.reform_data[2019],
+                                  tb.reform_data[2019])
+    # results for different inputs are discarded
+    run_years.clear()
+    tb_new = TaxBrain(2018, 2018, microdata=cps_subsample, use_cps=True)
+    tb_new.run(checkpoint_dir=tmp_path)
+    assert run_years == [(2018, "base")]
+
+
+def _run_in_process(code, seed, *args):
+    """
+    Run Python code in a new process with the given hash seed, which
+    changes the order of sets such as the one the default variables are
+    built from
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)
+    )))
+    env = {**os.environ, "PYTHONHASHSEED": str(seed),
+           "PYTHONPATH": os.pathsep.join(
+               [root, os.environ.get("PYTHONPATH", "")]
+           )}
+    subprocess.run([sys.executable, "-c", code, *map(str, args)], env=env,
+                   check=True)
+
+
+def test_checkpoint_new_process(cps_subsample, tmp_path):
+    data = tmp_path / "data.csv"
+    cps_subsample.iloc[:3000].to_csv(data, index=False)
+    checkpoint_dir = tmp_path / "checkpoint"
+    code = (
+        "import sys\n"
+        "from taxbrain import TaxBrain\n"
+        "tb = TaxBrain(2018, 2018, microdata=sys.argv[1], use_cps=True)\n"
+        "tb.run(checkpoint_dir=sys.argv[2])\n"
+    )
+    _run_in_process(code, 1, data, checkpoint_dir)
+    saved = {path.name: path.stat().st_mtime_ns
+             for path in checkpoint_dir.glob("*.pkl")}
+    assert sorted(saved) == ["2018_base.pkl"]
+    # a run in a process with another hash seed resumes from the results
+    # saved instead of discarding them
+    _run_in_process(code, 2, data, checkpoint_dir)
+    assert saved == {path.name: path.stat().st_mtime_ns
+                     for path in checkpoint_dir.glob("*.pkl")}
+
+
+def test_year_chunks():
+    years = list(range(2018, 2028))
+    chunks = _year_chunks(years, 3)
+    assert chunks == [[2018, 2019, 2020, 2021], [2022, 2023, 2024],
+                      [2025, 2026, 2027]]
+    assert _year_chunks(years, 1) == [years]
+    assert _year_chunks([2018, 2019], 2) == [[2018], [2019]]
+
+
+def test_make_calculators(reform_json_str):
+    assump = {
+        "consumption": {},
+        "growdiff_baseline": {},
+        "growdiff_response": {"AWAGE": {2019: 0.01}}
+    }
+    tb = TaxBrain(2018, 2019, use_cps=True, reform=reform_json_str,
+                  assump=assump)
+    base_calc, reform_calc = tb._make_calculators()
+    base_calc.advance_to_year(2019)
+    reform_calc.advance_to_year(2019)
+    # only the reform calculator uses the growdiff_response assumptions
+    assert np.allclose(base_calc.array("e00300"),
+                       reform_calc.array("e00300"))
+    assert not np.allclose(base_calc.array("e00200"),
+                           reform_calc.array("e00200"))
+
+
+def test_baseline_cache(tmp_path, reform_json_str):
+    BASELINE_CACHE.clear()
+    tb = TaxBrain(2018, 2018, use_cps=True, reform=reform_json_str)
+    tb.run(cache_dir=str(tmp_path))
+    assert len(BASELINE_CACHE) == 1
+    assert len(list(tmp_path.iterdir())) == 1
+    BASELINE_CACHE.clear()
+    reform = {"II_em": {2018: 2000}}
+    events = []
+    cached_tb = TaxBrain(2018, 2018, use_cps=True, reform=reform,
+                         hooks=[events.append])
+    cached_tb.run(cache_dir=str(tmp_path))
+    # the baseline calculator is not created when its results are cached
+    scenarios = {event["scenario"] for event in events
+                 if event["phase"] == "policy"}
+    assert scenarios == {"reform"}
+    pd.testing.assert_frame_equal(cached_tb.base_data[2018],
+                                  tb.base_data[2018])
+    assert not np.allclose(cached_tb.reform_data[2018]["iitax"],
+                           tb.reform_data[2018]["iitax"])
+    BASELINE_CACHE.clear()
+
+
+def test_baseline_cache_new_process(cps_subsample, tmp_path):
+    data = tmp_path / "data.csv"
+    cps_subsample.iloc[:3000].to_csv(data, index=False)
+    cache_dir = tmp_path / "cache"
+    code = (
+        "import sys\n"
+        "from taxbrain import TaxBrain\n"
+        "scenarios = set()\n"
+        "tb = TaxBrain(2018, 2018, microdata=sys.argv[1], use_cps=True,\n"
+        "              reform={'II_em': {2018: float(sys.argv[3])}},\n"
+        "              hooks=[lambda event: scenarios.add(\n"
+        "                  (event['phase'], event.get('scenario')))])\n"
+        "tb.run(cache_dir=sys.argv[2])\n"
+        "assert (('policy', 'base') in scenarios) == (sys.argv[4] == 'miss')\n"
+    )
+    _run_in_process(code, 1, data, cache_dir, 2000, "miss")
+    assert len(list(cache_dir.iterdir())) == 1
+    # a process with another hash seed and the default variables finds the
+    # baseline results on disk
+    _run_in_process(code, 2, data, cache_dir, 3000, "hit")
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+def test_run_many(tb_static, reform_json_str):
+    if not tb_static.has_run:
+        tb_static.run()
+    reforms = [reform_json_str, {"II_em": {2019: 2000}}]
+    tb = TaxBrain(2018, 2019, use_cps=True)
+    tbs = tb.run_many(reforms)
+    assert len(tbs) == 2
+    for year in range(2018, 2020):
+        pd.testing.assert_frame_equal(tbs[0].reform_data[year],
+                                      tb_static.reform_data[year])
+        pd.testing.assert_frame_equal(tbs[1].base_data[year],
+                                      tb_static.base_data[year])
+    table = tbs[1].weighted_totals("combined")
+    assert table.loc["Difference", 2019] != 0
+    with pytest.raises(ValueError):
+        TaxBrain(2018, 2019, use_cps=True,
+                 behavior={"sub": 0.25}).run_many(reforms)
+
+
+def test_sweep(cps_subsample):
+    values = [0.124, 0.13, 0.14]
+    tb = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                  reform={"II_em": {2019: 2000}})
+    table = tb.sweep("FICA_ss_trt", values, years=[2019],
+                     num_workers=2)
+    assert list(table.index.names) == ["FICA_ss_trt", "year"]
+    assert table.index.equals(pd.MultiIndex.from_product(
+        [values, [2018, 2019, 2020]]
+    ))
+    assert "pc_aftertaxinc_ALL" in table.columns
+    # the current law rate leaves payroll taxes unchanged
+    assert (table.loc[0.124, "payrolltax"] == 0).all()
+    assert (table.loc[(slice(None), 2018), "combined"] == 0).all()
+    assert np.all(np.diff(table.xs(2020, level="year")["payrolltax"]) > 0)
+    # matches a single run of the same reform
+    tb_point = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                        reform={"II_em": {2019: 2000},
+                                "FICA_ss_trt": {2019: 0.14}})
+    tb_point.run()
+    expected = tb_point.weighted_totals("combined").loc["Difference"]
+    assert np.allclose(table.loc[0.14, "combined"].values, expected.values)
+    diff = tb_point.differences_table(2020, "weighted_deciles", "combined")
+    assert table.loc[(0.14, 2020), "pc_aftertaxinc_ALL"] == pytest.approx(
+        diff.loc["ALL", "pc_aftertaxinc"]
+    )
+    with pytest.raises(ValueError):
+        tb.sweep("not_a_param", values)
+
+
+def test_solve(cps_subsample):
+    reform = {"II_em": {2019: 6000}}
+    tb = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                  reform=reform)
+    value, history = tb.solve("FICA_ss_trt", (0.124, 0.2), years=[2019],
+                              rtol=1e-5)
+    assert 0.124 < value < 0.2
+    assert list(history.columns) == ["sample", "FICA_ss_trt", "difference"]
+    # the value is found with a sample before all of the records are used
+    assert (history["sample"].iloc[:3] == 0.05).all()
+    assert history["sample"].iloc[-1:].isna().all()
+    assert history["FICA_ss_trt"].iloc[-1] == value
+    tb_check = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                        reform={**reform, "FICA_ss_trt": {2019: value}})
+    tb_check.run()
+    table = tb_check.weighted_totals("combined", include_total=True)
+    assert table.loc["Difference", "Total"] == pytest.approx(
+        history["difference"].iloc[-1]
+    )
+    assert abs(table.loc["Difference", "Total"]) <= (
+        1e-5 * table.loc["Base", "Total"]
+    )
+    with pytest.raises(ValueError):
+        tb.solve("FICA_ss_trt", (0.124, 0.125), years=[2019], sample=None)
+    # only scalar parameters can be solved for
+    with pytest.raises(ValueError, match="MARS"):
+        tb.solve("STD", (0, 20000), years=[2019])
+    # the search fails if the target is not hit in max_iter iterations
+    with pytest.raises(ValueError, match="iterations"):
+        tb.solve("FICA_ss_trt", (0.124, 0.2), years=[2019], rtol=1e-12,
+                 max_iter=1)
+
+
+def test_illinois():
+    root, froot, a, b = _illinois(lambda x: x ** 3 - 2, 0, -2, 2, 6, 1e-10,
+                                  100)
+    assert root == pytest.approx(2 ** (1 / 3))
+    assert abs(froot) <= 1e-10
+    assert a <= root <= b
+    # stops after max_iter evaluations
+    calls = []
+
+    def func(x):
+        calls.append(x)
+        return x ** 3 - 2
+    root, froot, _, _ = _illinois(func, 0, -2, 2, 6, 1e-10, 3)
+    assert len(calls) == 3
+    # the residual shows the search has not converged
+    assert froot == root ** 3 - 2
+    assert abs(froot) > 1e-10
+
+
+def test_iter_run(tb_static, reform_json_str):
+    if not tb_static.has_run:
+        tb_static.run()
+    tb = TaxBrain(2018, 2019, use_cps=True, reform=reform_json_str)
+    years = []
+    for year, base, reform in tb.iter_run(retain=False):
+        years.append(year)
+        pd.testing.assert_frame_equal(base, tb_static.base_data[year])
+        pd.testing.assert_frame_equal(reform, tb_static.reform_data[year])
+    assert years == [2018, 2019]
+    assert not tb.has_run
+    assert 2018 not in tb.base_data
+    with pytest.raises(TypeError):
+        next(tb.iter_run(dict()))
+
+
+def test_first_year():
+    reform = {"II_em": {2021: 0}, "STD-indexed": {"2020": False}}
+    assert _first_year(reform) == 2020
+    assert _first_year(
+        {"STD": [{"MARS": "single", "year": 2022, "value": 0}]}
+    ) == 2022
+    # adjustments without a year apply to every year
+    assert _first_year({"STD": [{"MARS": "single", "value": 0}]}) == (
+        TaxBrain.FIRST_BUDGET_YEAR
+    )
+    assert _first_year({"II_em": 0}) == TaxBrain.FIRST_BUDGET_YEAR
+
+
+def test_reform_years(reform_json_str):
+    tb = TaxBrain(2018, 2021, use_cps=True, reform=reform_json_str)
+    assert tb._reform_years() == [2019, 2020, 2021]
+    tb = TaxBrain(2018, 2021, use_cps=True)
+    assert tb._reform_years() == []
+    assump = {
+        "consumption": {},
+        "growdiff_baseline": {},
+        "growdiff_response": {"AWAGE": {2020: 0.01}}
+    }
+    tb = TaxBrain(2018, 2021, use_cps=True, assump=assump)
+    assert tb._reform_years() == [2020, 2021]
+
+
 def test_baseline_policy():
     base = {"II_em": {2019: 0}}
     reform = {"II_em": {2025: 2000}}
@@ -37,6 +355,120 @@ def test_dynamic_run(tb_dynamic):
     tb_dynamic.run()
 
 
+def test_dynamic_run_parallel(cps_subsample, reform_json_str):
+    tb_serial = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                         reform=reform_json_str, behavior={"sub": 0.25})
+    tb_serial.run()
+    tb = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                  reform=reform_json_str, behavior={"sub": 0.25})
+    tb.run(num_workers=2)
+    for year in range(2018, 2021):
+        pd.testing.assert_frame_equal(tb.base_data[year],
+                                      tb_serial.base_data[year])
+        pd.testing.assert_frame_equal(tb.reform_data[year],
+                                      tb_serial.reform_data[year])
+
+
+def test_chunked_run(cps_subsample, reform_json_str):
+    tb_full = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                       reform=reform_json_str)
+    tb_full.run()
+    tb = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                  reform=reform_json_str)
+    tb.run(chunk_size=7000)
+    for year in range(2018, 2021):
+        pd.testing.assert_frame_equal(tb.base_data[year],
+                                      tb_full.base_data[year])
+        pd.testing.assert_frame_equal(tb.reform_data[year],
+                                      tb_full.reform_data[year])
+    with pytest.raises(ValueError):
+        tb.run(chunk_size=7000, use_cache=True)
+
+
+def test_chunked_run_memory(cps_subsample, tmp_path):
+    # memory in use when each partition starts does not grow with the
+    # number of partitions already run
+    in_use = []
+
+    def record_memory(event):
+        if event["phase"] == "records" and event["event"] == "start":
+            gc.collect()
+            if tracemalloc.is_tracing():
+                in_use.append(tracemalloc.get_traced_memory()[0])
+            elif event["chunk"] == 1:
+                # Tax-Calculator's functions are compiled in the first
+                # partition, which is slow to trace
+                tracemalloc.start()
+
+    microdata = cps_subsample.iloc[:12000]
+    tb = TaxBrain(2018, 2018, microdata=microdata, use_cps=True,
+                  hooks=[record_memory])
+    try:
+        tb.run(chunk_size=3000, results_dir=tmp_path)
+    finally:
+        tracemalloc.stop()
+    assert len(in_use) == 2
+    # the results of each partition take about 1 MB
+    assert max(in_use[1:]) - in_use[0] < 5e5
+    assert isinstance(tb.results.array("s006").base, np.memmap)
+    assert len(tb.base_data[2018].index) == len(microdata.index)
+
+
+def test_sharded_run(cps_subsample, reform_json_str):
+    tb_full = TaxBrain(2019, 2019, microdata=cps_subsample, use_cps=True,
+                       reform=reform_json_str, behavior={"sub": 0.25})
+    tb_full.run()
+    tb = TaxBrain(2019, 2019, microdata=cps_subsample, use_cps=True,
+                  reform=reform_json_str, behavior={"sub": 0.25})
+    tb.run(num_shards=3, num_workers=2)
+    pd.testing.assert_frame_equal(tb.base_data[2019], tb_full.base_data[2019])
+    pd.testing.assert_frame_equal(tb.reform_data[2019],
+                                  tb_full.reform_data[2019])
+    with pytest.raises(ValueError):
+        tb.run(num_shards=3, chunk_size=7000)
+
+
+def test_sharded_workers(cps_subsample, monkeypatch):
+    def compute(lazy_values, client, num_workers):
+        computing.append(num_workers)
+        return _compute(lazy_values, client, 1)
+
+    def record_phase(event):
+        if event["event"] == "start":
+            phases.append((event["phase"], event.get("chunk"),
+                           bool(computing)))
+
+    computing = []
+    phases = []
+    monkeypatch.setattr(sys.modules["taxbrain.taxbrain"], "_compute",
+                        compute)
+    tb = TaxBrain(2018, 2018, microdata=cps_subsample.iloc[:6000],
+                  use_cps=True, hooks=[record_phase])
+    tb.run(num_shards=2)
+    # there is one worker for each shard by default
+    assert computing == [2]
+    # the records and calculators are only created by the workers
+    records = [(chunk, in_worker) for phase, chunk, in_worker in phases
+               if phase == "records"]
+    # the shards may be run in any order
+    assert sorted(records) == [(0, True), (1, True)]
+    assert all(in_worker for phase, _, in_worker in phases
+               if phase == "policy")
+    assert len(tb.base_data[2018].index) == 6000
+
+
+def test_compact_run(cps_subsample, reform_json_str):
+    tables = []
+    for result_dtype in ["float64", "compact"]:
+        tb = TaxBrain(2019, 2019, microdata=cps_subsample, use_cps=True,
+                      reform=reform_json_str, result_dtype=result_dtype)
+        tb.run()
+        tables.append(tb.weighted_totals("combined"))
+    assert tb.base_data[2019]["XTOT"].dtype == np.int8
+    assert tb.base_data[2019]["combined"].dtype == np.float32
+    assert np.allclose(tables[0], tables[1], rtol=1e-6)
+
+
 def test_weighted_totals(tb_static):
     table = tb_static.weighted_totals("combined")
     assert isinstance(table, pd.DataFrame)
@@ -88,6 +520,60 @@ def test_distribution_table(tb_static):
                                      "expanded_income", "nonreform")
 
 
+def test_table_cache(tb_static):
+    table = tb_static.distribution_table(2019, "weighted_deciles",
+                                         "expanded_income", "reform")
+    # tables are computed without adding columns to the stored results
+    assert "count" not in tb_static.reform_data[2019]
+    assert "count" not in tb_static.results.variables
+    # cached tables are returned as copies
+    table.iloc[:, :] = 0.
+    cached = tb_static.distribution_table(2019, "weighted_deciles",
+                                          "expanded_income", "reform")
+    assert not cached.equals(table)
+    diff = tb_static.differences_table(2019, "weighted_deciles",
+                                       "combined")
+    assert diff.equals(
+        tb_static.differences_table(2019, "weighted_deciles", "combined")
+    )
+    # tables are computed again once the results they use are replaced
+    tb = TaxBrain(2019, 2019, use_cps=True)
+    tb.base_data[2019] = tb_static.base_data[2019].copy()
+    tb.reform_data[2019] = tb_static.reform_data[2019].copy()
+    before = tb.differences_table(2019, "weighted_deciles", "combined")
+    dist_before = tb.distribution_table(2019, "weighted_deciles",
+                                        "expanded_income", "reform")
+    reform = tb_static.reform_data[2019].copy()
+    reform["iitax"] += 100.
+    reform["combined"] += 100.
+    tb.reform_data[2019] = reform
+    after = tb.differences_table(2019, "weighted_deciles", "combined")
+    assert after.loc["ALL", "tot_change"] > before.loc["ALL", "tot_change"]
+    dist_after = tb.distribution_table(2019, "weighted_deciles",
+                                       "expanded_income", "reform")
+    assert (dist_after.loc["ALL", "iitax"] >
+            dist_before.loc["ALL", "iitax"])
+    # tables of the baseline are unchanged
+    assert tb.distribution_table(
+        2019, "weighted_deciles", "expanded_income", "base"
+    ).equals(tb_static.distribution_table(2019, "weighted_deciles",
+                                          "expanded_income", "base"))
+    # results can only be changed by storing new ones
+    totals = tb.weighted_totals("iitax")
+    with pytest.raises(ValueError):
+        tb.reform_data[2019]["iitax"] *= 2
+    pd.testing.assert_frame_equal(tb.weighted_totals("iitax"), totals)
+    doubled = tb.reform_data[2019].copy()
+    doubled["iitax"] *= 2
+    tb.reform_data[2019] = doubled
+    assert np.allclose(tb.weighted_totals("iitax").loc["Reform"],
+                       2 * totals.loc["Reform"])
+    tb.reform_data[2019] = reform
+    tb.clear_cache()
+    assert tb.differences_table(2019, "weighted_deciles",
+                                "combined").equals(after)
+
+
 def test_user_input(reform_json_str, assump_json_str):
     valid_reform = {
         "II_rt7": {
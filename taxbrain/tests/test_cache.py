@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import taxcalc as tc
+from taxbrain.cache import (BaselineCache, DefaultsCache, Checkpoint,
+                            hash_inputs, hash_microdata)
+
+
+def test_hash_microdata(tmp_path):
+    df = pd.DataFrame({"RECID": [1, 2, 3], "e00200": [1., 2., 3.]})
+    assert hash_microdata(df) == hash_microdata(df.copy())
+    changed = df.copy()
+    changed.loc[1, "e00200"] = 4.
+    assert hash_microdata(df) != hash_microdata(changed)
+    path = tmp_path / "data.csv"
+    df.to_csv(path, index=False)
+    assert hash_microdata(str(path)) == hash_microdata(path)
+    assert hash_microdata(None) != hash_microdata(str(path))
+
+
+def test_hash_inputs():
+    assert hash_inputs({"a": 1, "b": 2}) == hash_inputs({"b": 2, "a": 1})
+    assert hash_inputs({"a": 1}, 2018) != hash_inputs({"a": 1}, 2019)
+
+
+def test_baseline_cache(tmp_path):
+    cache = BaselineCache(maxsize=2)
+    results = {2018: pd.DataFrame({"s006": [1., 2.]})}
+    cache.put("a", results)
+    cache.put("b", results)
+    assert cache.get("a") is results
+    # "b" is the least recently used entry
+    cache.put("c", results, cache_dir=tmp_path)
+    assert "b" not in cache
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    cache.clear()
+    disk_results = cache.get("c", cache_dir=tmp_path)
+    pd.testing.assert_frame_equal(disk_results[2018], results[2018])
+    assert "c" in cache
+
+
+def test_defaults_cache():
+    cache = DefaultsCache(maxsize=1)
+    reform = {"II_em": {2020: 1000}, "STD-indexed": {2021: False}}
+    growdiff = {"ACPIU": {2019: 0.01}}
+    # copies match newly built objects and changing one does not change
+    # the next copy
+    policy = cache.policy()
+    policy.implement_reform(reform)
+    expected = tc.Policy()
+    expected.implement_reform(reform)
+    assert np.allclose(policy._II_em, expected._II_em)
+    assert np.allclose(policy._STD, expected._STD)
+    assert np.allclose(cache.policy()._II_em, tc.Policy()._II_em)
+    gfactors = cache.growfactors(growdiff)
+    gdiff = tc.GrowDiff()
+    gdiff.update_growdiff(growdiff)
+    expected_gf = tc.GrowFactors()
+    gdiff.apply_to(expected_gf)
+    assert (gfactors.factor_value("ACPIU", 2019) ==
+            expected_gf.factor_value("ACPIU", 2019))
+    assert (cache.growfactors().factor_value("ACPIU", 2019) ==
+            tc.GrowFactors().factor_value("ACPIU", 2019))
+    # policy is indexed with the growth factors for the growdiff
+    assert np.allclose(cache.policy(growdiff)._STD,
+                       tc.Policy(expected_gf)._STD)
+    assert len(cache._policies) == 1
+    metadata = cache.policy_metadata()
+    assert metadata["II_em"]["title"] == tc.Policy().metadata()["II_em"][
+        "title"]
+    # changes to the metadata returned do not affect the cache
+    metadata["II_em"]["title"] = ""
+    metadata["II_em"]["value"].clear()
+    del metadata["STD"]
+    metadata = cache.policy_metadata()
+    assert metadata["II_em"]["title"]
+    assert metadata["II_em"]["value"]
+    assert "STD" in metadata
+    cache.clear()
+    assert len(cache._policies) == 0
+
+
+def test_checkpoint(tmp_path):
+    df = pd.DataFrame({"s006": [1., 2.], "iitax": [3., 4.]})
+    checkpoint = Checkpoint(tmp_path, "a")
+    assert checkpoint.open() == {}
+    checkpoint.save(2018, "base", df)
+    checkpoint.save(2019, "reform", df)
+    saved = Checkpoint(tmp_path, "a").open()
+    assert sorted(saved) == [(2018, "base"), (2019, "reform")]
+    pd.testing.assert_frame_equal(saved[(2018, "base")], df)
+    # results saved for other inputs are removed
+    # other files in the directory are neither loaded nor removed
+    pd.to_pickle(df, tmp_path / "baseline_abc.pkl")
+    pd.to_pickle(df, tmp_path / "notes.pkl")
+    assert sorted(Checkpoint(tmp_path, "a").open()) == sorted(saved)
+    assert Checkpoint(tmp_path, "b").open() == {}
+    assert sorted(path.name for path in tmp_path.glob("*.pkl")) == [
+        "baseline_abc.pkl", "notes.pkl"
+    ]
+    assert Checkpoint(tmp_path, "a").open() == {}
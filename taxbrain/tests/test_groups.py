@@ -0,0 +1,97 @@
+import pytest
+import numpy as np
+import pandas as pd
+from taxcalc.utils import (DIST_VARIABLES, DIFF_VARIABLES, SOI_AGI_BINS,
+                           create_distribution_table, create_difference_table)
+from taxbrain import (ResultsStore, IncomeGroups, grouped_distribution_table,
+                      grouped_difference_table)
+
+
+def results_data(seed, num_records=2000):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(
+        rng.uniform(-100., 100., (num_records, len(DIST_VARIABLES))),
+        columns=DIST_VARIABLES
+    )
+    income = rng.lognormal(10., 1.5, num_records)
+    income[:100] = 0.
+    income[100:150] *= -1.
+    # make sure every income bin has records in it
+    edges = np.array(SOI_AGI_BINS[1:-1])
+    income[150:150 + len(edges)] = edges * 1.01
+    data["expanded_income"] = income
+    data["aftertax_income"] = income * 0.8 + 1000.
+    data["s006"] = rng.uniform(50., 150., num_records)
+    data["XTOT"] = rng.integers(0, 5, num_records).astype(float)
+    for var in ["standard", "c04470", "c09600"]:
+        data[var] = np.where(rng.random(num_records) > 0.5, data[var], 0.)
+    return data
+
+
+@pytest.fixture
+def store():
+    store = ResultsStore([2020])
+    base = results_data(0)
+    reform = base.copy()
+    reform["combined"] += np.linspace(-50., 50., len(reform.index))
+    reform["aftertax_income"] -= np.linspace(-50., 50., len(reform.index))
+    store.set_frame(2020, "base", base)
+    store.set_frame(2020, "reform", reform)
+    return store
+
+
+@pytest.mark.parametrize(
+    "groupby,pop_quantiles",
+    [("weighted_deciles", False), ("weighted_deciles", True),
+     ("standard_income_bins", False), ("soi_agi_bins", False)]
+)
+def test_tables_match_taxcalc(store, groupby, pop_quantiles):
+    groups = IncomeGroups(store)
+    labels = groups.labels(2020, groupby, "base", pop_quantiles)
+    base = store.frame(2020, "base")
+    reform = store.frame(2020, "reform")
+    table = grouped_distribution_table(base, labels, groupby, pop_quantiles)
+    data = base.copy()
+    data["count"] = data["s006"] * data["XTOT"] if pop_quantiles else (
+        data["s006"]
+    )
+    for col, var in [("count_StandardDed", "standard"),
+                     ("count_ItemDed", "c04470"), ("count_AMT", "c09600")]:
+        data[col] = data["count"].where(data[var] > 0., 0.)
+    expected = create_distribution_table(data, groupby, "expanded_income",
+                                         pop_quantiles)
+    assert list(table.index) == list(expected.index)
+    assert list(table.columns) == list(expected.columns)
+    assert np.allclose(table.values, expected.values.astype(float))
+
+    table = grouped_difference_table(base, reform, labels, groupby,
+                                     "combined", pop_quantiles)
+    expected = create_difference_table(
+        base[DIFF_VARIABLES].copy(), reform[DIFF_VARIABLES].copy(), groupby,
+        "combined", pop_quantiles
+    )
+    assert list(table.index) == list(expected.index)
+    assert list(table.columns) == list(expected.columns)
+    assert np.allclose(table.values, expected.values.astype(float),
+                       equal_nan=True)
+
+
+def test_income_groups(store):
+    groups = IncomeGroups(store)
+    order = groups.order(2020, "aftertax_income", "reform")
+    values = store.frame(2020, "reform")["aftertax_income"].values
+    assert np.all(np.diff(values[order]) >= 0)
+    labels = groups.labels(2020, "weighted_deciles")
+    assert labels.min() == 0 and labels.max() == 13
+    # the labels are only computed once
+    assert groups.labels(2020, "weighted_deciles") is labels
+    bins = groups.bins(2020, "expanded_income", [-9e99, 0., 9e99], right=True)
+    income = store.frame(2020, "base")["expanded_income"].values
+    assert np.array_equal(bins, np.where(income <= 0., 0, 1))
+    # new results replace the groups computed from the old results
+    store.set_frame(2020, "base", results_data(1))
+    assert groups.labels(2020, "weighted_deciles") is not labels
+    with pytest.raises(ValueError):
+        groups.labels(2020, "quintiles")
+    with pytest.raises(ValueError):
+        groups.labels(2020, "standard_income_bins", pop_quantiles=True)
@@ -0,0 +1,46 @@
+import pytest
+from taxbrain import TaxBrain, Hooks, PHASES
+
+
+def test_hooks():
+    hooks = Hooks()
+    events = []
+    hooks.add(events.append)
+    with hooks.phase("calc_all", 2020, "base", chunk=1):
+        pass
+    assert [event["event"] for event in events] == ["start", "end"]
+    start, end = events
+    assert start["phase"] == end["phase"] == "calc_all"
+    assert start["year"] == 2020 and start["scenario"] == "base"
+    assert end["chunk"] == 1
+    assert end["duration"] >= 0 and "duration" not in start
+    # the end event is emitted even if the phase fails
+    with pytest.raises(RuntimeError):
+        with hooks.phase("table"):
+            raise RuntimeError()
+    assert events[-1]["event"] == "end"
+    hooks.remove(events.append)
+    with hooks.phase("records"):
+        pass
+    assert len(events) == 4
+    with pytest.raises(TypeError):
+        hooks.add("not a function")
+
+
+def test_run_hooks(cps_subsample):
+    events = []
+    tb = TaxBrain(2019, 2019, microdata=cps_subsample, use_cps=True,
+                  reform={"II_em": {2019: 1000}}, hooks=[events.append])
+    tb.run()
+    tb.differences_table(2019, "weighted_deciles", "combined")
+    ends = [event for event in events if event["event"] == "end"]
+    assert {event["phase"] for event in ends} == set(PHASES) - {"response"}
+    assert {
+        (event["phase"], event["scenario"]) for event in ends
+        if event["year"] == 2019 and event["phase"] != "table"
+    } == {
+        (phase, scenario)
+        for phase in ["advance_to_year", "calc_all", "dataframe"]
+        for scenario in ["base", "reform"]
+    }
+    assert len(events) == 2 * len(ends)
@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+import pandas as pd
+from taxbrain import TaxBrain, read_microdata, convert_microdata
+from taxbrain.cache import hash_microdata
+
+
+@pytest.fixture
+def csv_path(tmp_path, cps_subsample):
+    path = tmp_path / "cps.csv"
+    cps_subsample.to_csv(path, index=False)
+    return path
+
+
+def test_npy_microdata(tmp_path, csv_path):
+    npy_dir = tmp_path / "cps_npy"
+    convert_microdata(csv_path, npy_dir)
+    data = read_microdata(str(npy_dir))
+    # the columns are read from the memory mapped files, not copied
+    assert isinstance(data["s006"].values.base, np.memmap)
+    expected = pd.read_csv(csv_path)
+    pd.testing.assert_frame_equal(data[expected.columns], expected)
+    assert hash_microdata(npy_dir) == hash_microdata(str(npy_dir))
+    # CSV files and DataFrames are passed on to Tax-Calculator
+    assert read_microdata(str(csv_path)) == str(csv_path)
+    assert read_microdata(expected) is expected
+    with pytest.raises(ValueError):
+        convert_microdata(csv_path, tmp_path / "cps.xlsx", "xlsx")
+
+
+def test_npy_microdata_run(tmp_path, csv_path):
+    npy_dir = tmp_path / "cps_npy"
+    convert_microdata(csv_path, npy_dir)
+    reform = {"II_em": {2019: 1000}}
+    tables = []
+    for microdata in [str(csv_path), str(npy_dir)]:
+        tb = TaxBrain(2019, 2019, microdata=microdata, use_cps=True,
+                      reform=reform)
+        tb.run()
+        tables.append(tb.weighted_totals("combined"))
+    pd.testing.assert_frame_equal(tables[0], tables[1])
+
+
+@pytest.mark.parametrize("fmt,filename",
+                         [("parquet", "cps.parquet"), ("arrow", "cps.arrow")])
+def test_arrow_microdata(tmp_path, csv_path, fmt, filename):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / filename
+    convert_microdata(csv_path, path, fmt)
+    data = read_microdata(path)
+    pd.testing.assert_frame_equal(data, pd.read_csv(csv_path))
@@ -0,0 +1,148 @@
+import pytest
+import numpy as np
+import pandas as pd
+from taxbrain import ResultsStore, ScenarioData
+
+
+@pytest.fixture
+def store():
+    store = ResultsStore(range(2018, 2021))
+    for i, year in enumerate(store.years):
+        base = pd.DataFrame({"s006": [1., 2., 3.], "iitax": [10., 20., 30.]})
+        reform = base.copy()
+        reform["iitax"] += i
+        store.set_frame(year, "base", base)
+        store.set_frame(year, "reform", reform)
+    return store
+
+
+def test_frame(store):
+    df = store.frame(2019, "reform")
+    assert isinstance(df, pd.DataFrame)
+    assert list(df.columns) == ["s006", "iitax"]
+    assert np.allclose(df["iitax"], [11., 21., 31.])
+    # frames are views on the store
+    assert np.shares_memory(df["iitax"].values, store.array("iitax"))
+    assert store.array("iitax").shape == (3, 3, 2)
+    # the views cannot be changed in place, which would leave the cached
+    # weighted sums out of date
+    sums = store.weighted_sum("iitax")
+    with pytest.raises(ValueError):
+        df["iitax"] *= 2
+    with pytest.raises(ValueError):
+        df.loc[0, "iitax"] = 0.
+    with pytest.raises(ValueError):
+        store.array("iitax")[:] = 0.
+    assert np.allclose(store.weighted_sum("iitax"), sums)
+    with pytest.raises(KeyError):
+        store.frame(2021, "base")
+    with pytest.raises(ValueError):
+        store.frame(2019, "policy")
+
+
+def test_set_frame_validation(store):
+    with pytest.raises(ValueError):
+        store.set_frame(2018, "base", pd.DataFrame({"s006": [1., 2., 3.]}))
+    with pytest.raises(ValueError):
+        store.set_frame(2018, "base",
+                        pd.DataFrame({"s006": [1.], "iitax": [1.]}))
+
+
+def test_weighted_sum(store):
+    sums = store.weighted_sum("iitax")
+    assert sums.shape == (3, 2)
+    assert np.allclose(sums[:, 0], 140.)
+    assert np.allclose(sums[:, 1], [140., 146., 152.])
+
+
+def test_weighted_sums(store):
+    sums = store.weighted_sums(["iitax", "s006"])
+    assert sums.shape == (2, 3, 2)
+    assert np.allclose(sums[0], store.weighted_sum("iitax"))
+    assert np.allclose(sums[1], 14.)
+    # sums are recomputed once new results are stored
+    reform = store.frame(2020, "reform").copy()
+    reform["iitax"] = 0.
+    store.set_frame(2020, "reform", reform)
+    assert np.allclose(store.weighted_sum("iitax")[:, 1], [140., 146., 0.])
+    store.clear_sums()
+    assert np.allclose(store.weighted_sums(["iitax", "s006"])[1], 14.)
+
+
+def test_set_rows(tmp_path):
+    df = pd.DataFrame({"s006": [1., 2., 3., 4., 5.],
+                       "iitax": [10., 20., 30., 40., 50.]})
+    store = ResultsStore([2020], directory=tmp_path)
+    with pytest.raises(ValueError):
+        store.set_rows(2020, "base", df.iloc[:2], 0)
+    store.set_rows(2020, "base", df.iloc[:2], 0, num_records=5)
+    assert store.num_records == 5
+    # the results are only available once every record is written
+    assert not store.has_year(2020, "base")
+    store.set_rows(2020, "base", df.iloc[2:], 2)
+    assert store.has_year(2020, "base")
+    pd.testing.assert_frame_equal(store.frame(2020, "base"), df)
+    assert store.weighted_sum("iitax")[0, 0] == 550.
+    with pytest.raises(ValueError):
+        store.set_rows(2020, "reform", df.iloc[2:], 3)
+    # the results are kept in memory mapped files
+    assert isinstance(store.array("iitax").base, np.memmap)
+    assert [path.name for path in tmp_path.iterdir()] == ["float64.npy"]
+
+
+def test_compact_results():
+    store = ResultsStore([2020], result_dtype="compact")
+    df = pd.DataFrame({
+        "s006": [1.5, 2.5, 3.5], "MARS": [1., 2., 4.],
+        "iitax": [10.1, 20.2, 1e7 + 0.3], "RECID": [1., 2., 100000.]
+    })
+    store.set_frame(2020, "base", df)
+    frame = store.frame(2020, "base")
+    assert list(frame.columns) == list(df.columns)
+    assert dict(frame.dtypes) == {
+        "s006": np.float64, "MARS": np.int8, "iitax": np.float32,
+        "RECID": np.int32
+    }
+    assert np.shares_memory(frame["iitax"].values, store.array("iitax"))
+    # sums are accumulated in double precision
+    sums = store.weighted_sums(["s006", "MARS", "iitax"])[:, 0, 0]
+    expected = df[["s006", "MARS", "iitax"]].multiply(df["s006"], axis=0)
+    assert np.allclose(sums, expected.sum(), rtol=1e-7)
+    assert sums.dtype == np.float64
+    # variables whose values no longer fit are moved to a wider type
+    reform = df.copy()
+    reform.loc[0, "MARS"] = 1000.
+    store.set_frame(2020, "reform", reform)
+    assert store.frame(2020, "reform")["MARS"].dtype == np.int16
+    assert list(store.frame(2020, "reform")["MARS"]) == [1000, 2, 4]
+    assert list(store.frame(2020, "base")["MARS"]) == [1, 2, 4]
+    assert list(store.frame(2020, "base")["RECID"]) == [1, 2, 100000]
+    with pytest.raises(ValueError):
+        ResultsStore([2020], result_dtype="float16")
+
+
+def test_widen_memmap(tmp_path):
+    store = ResultsStore([2020], result_dtype="compact", directory=tmp_path)
+    df = pd.DataFrame({"s006": [1., 2.], "MARS": [1., 2.], "XTOT": [1., 3.]})
+    store.set_frame(2020, "base", df)
+    df.loc[1, "XTOT"] = 40000.
+    store.set_rows(2020, "reform", df.iloc[1:], 1)
+    assert isinstance(store.array("XTOT"), np.memmap)
+    assert list(store.array("XTOT")[0, :, 0]) == [1, 3]
+    assert store.array("XTOT")[0, 1, 1] == 40000
+    assert list(store.array("MARS")[0, :, 0]) == [1, 2]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "float64.npy", "int32.npy", "int8.npy"
+    ]
+
+
+def test_scenario_data(store):
+    base_data = ScenarioData(store, "base")
+    assert list(base_data) == [2018, 2019, 2020]
+    assert 2018 in base_data
+    assert 2021 not in base_data
+    del base_data[2018]
+    assert list(base_data.keys()) == [2019, 2020]
+    assert len(base_data) == 2
+    base_data[2018] = store.frame(2018, "reform")
+    assert np.allclose(base_data[2018]["iitax"], [10., 20., 30.])
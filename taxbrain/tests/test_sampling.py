@@ -0,0 +1,171 @@
+import pytest
+import numpy as np
+import pandas as pd
+from taxbrain import TaxBrain, StratifiedSample
+
+
+@pytest.fixture(scope="module")
+def population():
+    rng = np.random.default_rng(0)
+    num_records = 5000
+    return pd.DataFrame({
+        "MARS": rng.choice([1, 2, 4], size=num_records),
+        "e00200": rng.lognormal(10, 1.5, size=num_records),
+        "e00300": rng.lognormal(5, 2, size=num_records)
+    })
+
+
+def test_draw(population):
+    sample = StratifiedSample.draw(population, 0.1, random_state=1)
+    # three filing statuses with ten income groups each, plus the records
+    # with the largest incomes
+    assert sample.num_strata == 31
+    assert sample.sample_sizes.sum() == len(sample.positions)
+    assert np.all(np.diff(sample.positions) > 0)
+    income = population["e00200"] + population["e00300"]
+    top = np.argsort(-income.values)[:5]
+    assert np.isin(top, sample.positions).all()
+    # samples drawn with the same seed are nested
+    larger = StratifiedSample.draw(population, 0.3, random_state=1)
+    assert np.isin(sample.positions, larger.positions).all()
+    assert not np.array_equal(
+        sample.positions,
+        StratifiedSample.draw(population, 0.1, random_state=2).positions
+    )
+    full = StratifiedSample.draw(population, 1, random_state=1)
+    assert len(full.positions) == len(population.index)
+    with pytest.raises(ValueError):
+        StratifiedSample.draw(population, 0)
+
+
+def test_weights_and_errors(population):
+    sample = StratifiedSample.draw(population, 0.2, random_state=1)
+    weights = pd.DataFrame({"WT2020": np.full(len(population.index), 100.),
+                            "WT2021": np.arange(len(population.index)) + 1.})
+    factors = sample.weight_factors(weights)
+    sample_weights = weights.values[sample.positions] * factors
+    # weights add up to the weights of each stratum
+    for stratum in range(sample.num_strata):
+        in_sample = sample.sample_strata == stratum
+        in_population = sample.strata == stratum
+        assert np.allclose(sample_weights[in_sample].sum(axis=0),
+                           weights.values[in_population].sum(axis=0))
+    wt = sample_weights[:, 0]
+    values = population["e00200"].values[sample.positions] * wt
+    # the number of records is known, so its total has no error
+    assert sample.standard_error(sample.residuals(wt, wt)) == pytest.approx(
+        0, abs=1e-6
+    )
+    se = sample.standard_error(sample.residuals(values, wt))
+    assert se > 0
+    # same estimate from the sums used for tables
+    moments = sample.moments(values, wt)
+    assert np.sqrt(sample.variance(moments, wt)[0]) == pytest.approx(se)
+    # sums of each group add up to the sums of all records
+    labels = population["MARS"].values[sample.positions] // 2
+    group_moments = sample.moments(values, wt, labels, 3)
+    assert np.allclose(group_moments.sum(axis=1), moments[:, 0])
+    full = StratifiedSample.draw(population, 1, random_state=1)
+    assert full.standard_error(
+        full.residuals(population["e00200"].values * 100.,
+                       np.full(len(population.index), 100.))
+    ) == 0
+
+
+def test_sample_run(cps_subsample, reform_json_str):
+    tb_full = TaxBrain(2018, 2019, microdata=cps_subsample, use_cps=True,
+                       reform=reform_json_str)
+    tb_full.run()
+    tb = TaxBrain(2018, 2019, microdata=cps_subsample, use_cps=True,
+                  reform=reform_json_str, sample=0.25, sample_seed=5)
+    tb.run()
+    num_records = len(tb.base_data[2018].index)
+    assert num_records < 0.3 * len(cps_subsample.index)
+    assert num_records == len(tb.sample.positions)
+    # weights still add up to the population
+    assert np.allclose(tb.base_data[2019]["s006"].sum(),
+                       tb_full.base_data[2019]["s006"].sum())
+    totals = tb.weighted_totals("combined", include_total=True)
+    errors = tb.weighted_totals_se("combined", include_total=True)
+    assert (errors.loc[["Base", "Reform"]].values > 0).all()
+    # the reform does not start until 2019
+    assert errors.loc["Difference", 2018] == 0
+    assert errors.loc["Difference", 2019] > 0
+    full_totals = tb_full.weighted_totals("combined", include_total=True)
+    assert (np.abs(totals - full_totals) <= 4 * errors).all().all()
+    assert (tb_full.weighted_totals_se("combined").values == 0).all()
+
+    dist_se = tb.distribution_table_se(2019, "weighted_deciles",
+                                       "expanded_income", "reform")
+    dist = tb.distribution_table(2019, "weighted_deciles",
+                                 "expanded_income", "reform")
+    assert dist_se.index.equals(dist.index)
+    assert dist_se.columns.equals(dist.columns)
+    assert (dist_se.values >= 0).all()
+    assert dist_se.loc["ALL", "count"] == pytest.approx(0, abs=1e-6)
+    diff_se = tb.differences_table_se(2019, "standard_income_bins",
+                                      "combined")
+    assert diff_se.loc["ALL", "tot_change"] > 0
+    assert diff_se["mean"].isna().all()
+    full_diff_se = tb_full.differences_table_se(2019, "standard_income_bins",
+                                                "combined")
+    assert (full_diff_se.values == 0).all()
+
+    # the same sample is used when the records are run in chunks
+    tb_chunked = TaxBrain(2018, 2019, microdata=cps_subsample, use_cps=True,
+                          reform=reform_json_str, sample=0.25, sample_seed=5)
+    tb_chunked.run(chunk_size=2000)
+    pd.testing.assert_frame_equal(
+        tb_chunked.weighted_totals("combined"),
+        tb.weighted_totals("combined")
+    )
+    with pytest.raises(ValueError):
+        TaxBrain(2018, 2019, use_cps=True, sample=1.5)
+
+
+def test_run_progressive(cps_subsample, reform_json_str):
+    tb_full = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                       reform=reform_json_str)
+    tb_full.run()
+    tb = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                  reform=reform_json_str, sample_seed=3)
+    num_run = []
+    records = []
+    for frac, diagnostics in tb.run_progressive([0.1, 0.3, 1.0]):
+        records.append(diagnostics["num_records"].iloc[0])
+        num_run.append(len(tb.base_data[2020].index))
+        assert tb.has_run
+        errors = tb.weighted_totals_se("combined", include_total=True)
+        assert diagnostics.loc["combined", "standard_error"] == (
+            errors.loc["Difference", "Total"]
+        )
+        if frac < 1:
+            assert (diagnostics["standard_error"] > 0).all()
+            assert (diagnostics["relative_error"] > 0).all()
+    assert num_run == records
+    assert records[0] < records[1] < records[2] == len(cps_subsample.index)
+    assert diagnostics["change"].notna().all()
+    assert (diagnostics["standard_error"] == 0).all()
+    # the last stage uses every record
+    for var in ["combined", "iitax", "s006"]:
+        pd.testing.assert_frame_equal(tb.weighted_totals(var),
+                                      tb_full.weighted_totals(var))
+    pd.testing.assert_frame_equal(
+        tb.differences_table(2020, "weighted_deciles", "combined"),
+        tb_full.differences_table(2020, "weighted_deciles", "combined")
+    )
+
+    # stops once the errors are small enough
+    tb = TaxBrain(2018, 2020, microdata=cps_subsample, use_cps=True,
+                  reform=reform_json_str)
+    stages = list(tb.run_progressive([0.1, 0.3, 1.0], rtol=1e6))
+    assert len(stages) == 1
+    # a later run of every record does not keep the partial sample
+    tb.run()
+    assert tb.sample is None
+    assert (tb.weighted_totals_se("combined").values == 0).all()
+    dist_se = tb.distribution_table_se(2020, "weighted_deciles",
+                                       "expanded_income", "reform")
+    assert (dist_se.values == 0).all()
+    with pytest.raises(ValueError):
+        next(tb.run_progressive([0.5, 0.2]))
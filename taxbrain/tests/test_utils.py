@@ -1,3 +1,5 @@
+import sys
+import subprocess
 import taxbrain
 import pytest
 
@@ -34,3 +36,15 @@ def test_revenue_plot(tb_static):
         taxbrain.revenue_plot(tb_static, tax_vars=["income", "combined"])
     with pytest.raises(AssertionError):
         taxbrain.revenue_plot(tb_static, tax_vars=[])
+
+
+def test_lazy_imports():
+    # plotting and report dependencies are not loaded by importing taxbrain
+    code = (
+        "import sys, taxbrain; "
+        "print([m for m in ['matplotlib', 'pypandoc', 'tabulate'] "
+        "if m in sys.modules])"
+    )
+    out = subprocess.run([sys.executable, "-c", code], check=True,
+                         capture_output=True, text=True).stdout
+    assert out.strip() == "[]"
@@ -3,11 +3,9 @@ Helper functions for the various taxbrain modules
 """
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-import matplotlib.ticker as ticker
-from collections import defaultdict
 from typing import Union, Tuple
+# matplotlib is imported inside the plotting functions so that it is only
+# loaded once a plot is made rather than every time taxbrain is imported
 
 import taxcalc as tc
 from .typing import ParamToolsAdjustment, TaxcalcReform, PlotColors
@@ -63,66 +61,47 @@ def distribution_plot(
     fig: Matplotlib.pyplot figure object
         distribution plot
     """
-    def find_percs(data, group):
-        """
-        Find the percentage of people in the data set that saw
-        their income change by the given percentages
-        """
-        pop = data["s006"].sum()
-        large_pos_chng = data["s006"][data["pct_change"] > 5].sum() / pop
-        small_pos_chng = data["s006"][(data["pct_change"] <= 5) &
-                                      (data["pct_change"] > 1)].sum() / pop
-        small_chng = data["s006"][(data["pct_change"] <= 1) &
-                                  (data["pct_change"] >= -1)].sum() / pop
-        small_neg_change = data["s006"][(data["pct_change"] < -1) &
-                                        (data["pct_change"] > -5)].sum() / pop
-        large_neg_change = data["s006"][data["pct_change"] < -5].sum() / pop
-
-        return (
-            large_pos_chng, small_pos_chng, small_chng, small_neg_change,
-            large_neg_change
-        )
-
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
     # extract needed data from the TaxBrain object
-    ati_data = pd.DataFrame(
-        {"base": tb.base_data[year]["aftertax_income"],
-         "reform": tb.reform_data[year]["aftertax_income"],
-         "s006": tb.base_data[year]["s006"]}
+    base = tb.base_data[year]["aftertax_income"].values
+    reform = tb.reform_data[year]["aftertax_income"].values
+    s006 = tb.base_data[year]["s006"].values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_change = (reform - base) / base * 100
+    # fill in NaNs for graphing
+    pct_change = np.where(np.isnan(pct_change), 0., pct_change)
+    # categories of the change in after tax income, largest increase first
+    change = np.select(
+        [pct_change > 5, pct_change > 1, pct_change >= -1, pct_change > -5],
+        [0, 1, 2, 3], default=4
     )
-    ati_data["diff"] = ati_data["reform"] - ati_data["base"]
-    ati_data["pct_change"] = (ati_data["diff"] / ati_data["base"]) * 100
-    ati_data = ati_data.fillna(0.)  # fill in NaNs for graphing
-    # group tupules: (low income, high income, income group name)
-    groups = [
-        (-9e99, 9e99, "All"),
-        (1e6, 9e99, "$1M or More"),
-        (500000, 1e6, "$500K-1M"),
-        (200000, 500000, "$200K-500K"),
-        (100000, 200000, "$100K-200K"),
-        (75000, 100000, "$75K-100K"),
-        (50000, 75000, "$50K-75K"),
-        (40000, 50000, "$40K-50K"),
-        (30000, 40000, "$30K-40K"),
-        (20000, 30000, "$20K-30K"),
-        (10000, 20000, "$10K-20K"),
-        (-9e99, 10000, "Less than $10K")
+    num_changes = 5
+    # income groups, each including its upper bound
+    bin_edges = [-9e99, 10000, 20000, 30000, 40000, 50000, 75000, 100000,
+                 200000, 500000, 1e6, 9e99]
+    group_names = [
+        "Less than $10K", "$10K-20K", "$20K-30K", "$30K-40K", "$40K-50K",
+        "$50K-75K", "$75K-100K", "$100K-200K", "$200K-500K", "$500K-1M",
+        "$1M or More"
     ]
-
-    plot_data = defaultdict(list)
-    # traverse list in reverse to get the axis of the plot in correct order
-    for low, high, grp in groups:
-        # find income changes by group
-        sub_data = ati_data[(ati_data["base"] <= high) &
-                            (ati_data["base"] > low)]
-        results = find_percs(sub_data, grp)
-        plot_data[grp] = results
+    groups = tb.groups.bins(year, "aftertax_income", bin_edges, right=True)
+    valid = groups >= 0
+    # weight of each income group and change in income category
+    weights = np.bincount(
+        groups[valid] * num_changes + change[valid], weights=s006[valid],
+        minlength=len(group_names) * num_changes
+    ).reshape(len(group_names), num_changes)
+    weights = np.vstack([weights.sum(axis=0), weights[::-1]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        data = weights / weights.sum(axis=1, keepdims=True)
+    # traverse groups in reverse to get the axis of the plot in correct order
+    labels = ["All"] + group_names[::-1]
 
     legend_labels = [
         "Increase of > 5%", "Increase 1-5%", "Change < 1%",
         "Decrease of 1-5%", "Decrease > 5%"
     ]
-    labels = list(plot_data.keys())
-    data = np.array(list(plot_data.values()))
     data_cumsum = data.cumsum(axis=1)
     category_colors = plt.get_cmap("GnBu")(
         np.linspace(0.15, 0.85, data.shape[1]))
@@ -148,7 +127,7 @@ def distribution_plot(
     ax.set_xlabel("Portion of Bin", fontweight="bold")
     ax.set_ylabel("Expanded Income Bin", fontweight="bold")
     ax.get_xaxis().set_major_formatter(
-        mpl.ticker.FuncFormatter(lambda x, p: format(f'{int(x * 100)}%'))
+        ticker.FuncFormatter(lambda x, p: format(f'{int(x * 100)}%'))
     )
     if title == "default":
         title = f"Percentage Change In After Tax Income - {year}"
@@ -187,6 +166,9 @@ def differences_plot(
     fig: Matplotlib.pyplot figure object
         differences plot
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
+
     def axis_formatter(x, p):
         if x >= 0:
             return f"${x * 1e-9:,.2f}b"
@@ -219,10 +201,10 @@ def differences_plot(
     ax.spines["top"].set_visible(False)
     ax.spines["right"].set_visible(False)
     ax.get_yaxis().set_major_formatter(
-        mpl.ticker.FuncFormatter(axis_formatter)
+        ticker.FuncFormatter(axis_formatter)
     )
     ax.xaxis.set_ticks(list(plot_data.index))
-    ax.xaxis.set_major_formatter(mpl.ticker.ScalarFormatter(useOffset=False))
+    ax.xaxis.set_major_formatter(ticker.ScalarFormatter(useOffset=False))
 
     return fig
 
@@ -310,7 +292,7 @@ def lorenz_data(tb, year: int, var: str = "aftertax_income"):
     })
     data["wt_base"] = data["base"] * data["wt"]
     data["wt_reform"] = data["reform"] * data["wt"]
-    data.sort_values("base", inplace=True)
+    data = data.iloc[tb.groups.order(year, var, "base")]
     data["cwt"] = data["wt"].cumsum()
     data['percentile'] = data["cwt"] / data["wt"].sum()
     # each bin has 1% of the population
@@ -375,6 +357,7 @@ def lorenz_curve(
     -------
     None
     """
+    import matplotlib.pyplot as plt
     plot_data = lorenz_data(tb, year, var)
     fig, ax = plt.subplots()
     ax.plot([0, 1], [0, 1], c="black", alpha=0.5)  # 45 degree line
@@ -452,6 +435,9 @@ def volcano_plot(
     fig: Matplotlib.pyplot figure object
         volcano plot figure
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
+
     def log_axis(x, pos):
         """
         Converts y-axis log values
@@ -505,6 +491,9 @@ def revenue_plot(
     tax_vars: list
         List of tax varaibles to include on the graph
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ticker
+
     def axis_formatter(x, p):
         if x >= 0:
             return f"${x * 1e-9:,.2f}"
@@ -556,6 +545,6 @@ def revenue_plot(
     ax.spines['right'].set_visible(False)
     # convert y axis to billions
     ax.get_yaxis().set_major_formatter(
-        mpl.ticker.FuncFormatter(axis_formatter)
+        ticker.FuncFormatter(axis_formatter)
     )
     return fig